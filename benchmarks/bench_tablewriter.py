@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The MIT License (MIT)
+
+Copyright © 2019 Arnold Reinders
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the “Software”), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is furnished
+to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR
+IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+""" Benchmarks of the write paths of TableWriter
+
+Measures time, throughput and peak memory (as seen by tracemalloc) of
+Table.row, write_table, write_dict, write_dataframe, write_img_inline and
+write_mat for a range of table and image sizes, of the table paths
+with and without escaping of the cells, and of many small tables with
+each flush policy, using synthetic data and temporary files only. Results are written as JSON so that the results of
+two versions can be compared:
+
+    python benchmarks/bench_tablewriter.py --output new.json
+    python benchmarks/bench_tablewriter.py --compare old.json new.json
+
+Cases that need pandas, numpy or matplotlib are skipped when these are
+not installed.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import htmltables
+from htmltables import TableWriter, FlushPolicy
+
+def table_data(rows, cols):
+    rng = random.Random(rows * 1000 + cols)
+
+    return [[i] + [rng.random() for j in range(cols - 1)] for i in range(rows)]
+
+def bench_row(html, rows, cols):
+    data = table_data(rows, cols)
+    headers = ['col-' + str(j) for j in range(cols)]
+
+    def run():
+        with html.Table(headers) as tab:
+            for row in data:
+                tab.alt(['white', 'black', 'silver']).row(row)
+
+    return run, rows
+
+def text_data(rows, cols):
+    # labels that repeat, some of which need escaping
+    rng = random.Random(rows * 1000 + cols)
+    labels = ['label-' + str(i) for i in range(100)] + ['a < b', 'x & y', '<tensor>']
+
+    return [[rng.choice(labels) for j in range(cols)] for i in range(rows)]
+
+def bench_row_text(html, rows, cols):
+    data = text_data(rows, cols)
+    headers = ['col-' + str(j) for j in range(cols)]
+
+    def run():
+        with html.Table(headers) as tab:
+            for row in data:
+                tab.alt(['white', 'black', 'silver']).row(row)
+
+    return run, rows
+
+def bench_write_table(html, rows, cols):
+    data = table_data(rows, cols)
+    html.set_data(data=data, headers=['col-' + str(j) for j in range(cols)])
+
+    def run():
+        html.write_table(colors=['white', 'black', 'silver'])
+
+    return run, rows
+
+def bench_write_dict(html, rows):
+    # a dict is always written as two columns
+    d = {'key-' + str(i): value for i, value in enumerate(table_data(rows, 2))}
+
+    def run():
+        html.write_dict(d, colors=['white', 'black', 'silver'])
+
+    return run, rows
+
+def bench_write_dataframe(html, rows, cols):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(rows)
+    df = pd.DataFrame(rng.random((rows, cols)),
+                      columns=['col-' + str(j) for j in range(cols)])
+    df['label'] = ['row-' + str(i) for i in range(rows)]
+
+    def run():
+        html.write_dataframe(df, colors=['white', 'black', 'silver'])
+
+    return run, rows
+
+def bench_write_img_inline(html, size, directory):
+    data = os.urandom(size)
+
+    def run():
+        html.write_img_inline(data, 'image', 'p')
+
+    return run, size
+
+def bench_write_mat(html, size, directory):
+    import numpy as np
+
+    image = np.random.default_rng(size).random((size, size, 3))
+    fn = os.path.join(directory, 'mat.png')
+
+    def run():
+        html.write_mat(image, 'image', fn, 'p')
+
+    return run, size * size
+
+def bench_tables(html, tables, rows):
+    data = table_data(rows, 4)
+    headers = ['col-' + str(j) for j in range(4)]
+
+    def run():
+        for i in range(tables):
+            with html.Table(headers) as tab:
+                tab.rows(data, ['white', 'black', 'silver'])
+
+    return run, tables
+
+# case name -> (function, unit of throughput, modules needed)
+TABLE_CASES = {'row': (bench_row, 'rows/s', []),
+               'write_table': (bench_write_table, 'rows/s', []),
+               'write_dataframe': (bench_write_dataframe, 'rows/s', ['numpy', 'pandas'])}
+# run for each number of rows only
+DICT_CASES = {'write_dict': (bench_write_dict, 'rows/s', [])}
+# run with escape=False and escape=True
+ESCAPE_CASES = {'row': (bench_row, 'rows/s', []),
+                'row_text': (bench_row_text, 'rows/s', []),
+                'write_dataframe': (bench_write_dataframe, 'rows/s', ['numpy', 'pandas'])}
+IMAGE_CASES = {'write_img_inline': (bench_write_img_inline, 'bytes/s', []),
+               'write_mat': (bench_write_mat, 'pixels/s', ['numpy', 'matplotlib'])}
+# many small tables written with each flush policy
+FLUSH_POLICIES = {'default': lambda: None,
+                  'throughput': lambda: FlushPolicy.throughput(),
+                  'every_bytes': lambda: FlushPolicy(every_bytes=1 << 20, table=False),
+                  'every_seconds': lambda: FlushPolicy(every_seconds=1, table=False),
+                  'fsync_close': lambda: FlushPolicy(fsync='close'),
+                  'durable': lambda: FlushPolicy.durable()}
+
+def available(modules):
+    import importlib.util
+
+    return all(importlib.util.find_spec(m) is not None for m in modules)
+
+def measure(setup, args, directory, repeat, options={}):
+    """ Runs a case, returns the best time of repeat runs and the peak memory
+
+    A first run warms up (e.g. imports a backend) and is not counted. The
+    peak memory is measured in a separate run, because tracemalloc slows
+    down the code it traces.
+
+    Args:
+        options (dict): keyword arguments of TableWriter
+    """
+    fn = os.path.join(directory, 'bench.html')
+    times = []
+    peak = 0
+    for i in range(repeat + 2):
+        with TableWriter(fn, **options) as html:
+            run, units = setup(html, *args)
+            if i == repeat + 1:
+                tracemalloc.start()
+            start = time.perf_counter()
+            run()
+            html.flush()
+            if i == repeat + 1:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            elif i > 0:
+                times.append(time.perf_counter() - start)
+
+    return min(times), peak, units, os.path.getsize(fn)
+
+def import_time(repeat):
+    """ Returns the best time of importing htmltables in a new interpreter
+    """
+    code = 'import time; t = time.perf_counter(); import htmltables; ' \
+           'print(time.perf_counter() - t)'
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    times = []
+    for i in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], cwd=root,
+                             capture_output=True, text=True, check=True)
+        times.append(float(out.stdout))
+
+    return min(times)
+
+def run_all(quick, repeat):
+    if quick:
+        table_sizes = [(1000, 4), (10000, 4)]
+        escape_sizes = [(10000, 4)]
+        flush_sizes = [(200, 10)]
+        image_sizes = [100000, 1000000]
+        mat_sizes = [128, 512]
+    else:
+        table_sizes = [(1000, 4), (10000, 4), (100000, 4), (10000, 16), (100000, 16)]
+        escape_sizes = [(100000, 4), (100000, 16)]
+        flush_sizes = [(2000, 10)]
+        image_sizes = [100000, 1000000, 10000000]
+        mat_sizes = [256, 1024, 2048]
+
+    results = [{'case': 'import', 'params': {}, 'seconds': import_time(repeat)}]
+    print('{:<18s} {:<40s} {:>10s} {:>16s} {:>12s}'.format(
+          'case', 'params', 'seconds', 'throughput', 'peak MB'))
+    print('{:<18s} {:<40s} {:>10.4f}'.format('import', '', results[0]['seconds']))
+
+    with tempfile.TemporaryDirectory() as directory:
+        cases = []
+        for name, (setup, unit, modules) in TABLE_CASES.items():
+            for rows, cols in table_sizes:
+                cases.append((name, setup, unit, modules,
+                              {'rows': rows, 'cols': cols}, (rows, cols)))
+        for name, (setup, unit, modules) in DICT_CASES.items():
+            for rows in sorted(set(rows for rows, cols in table_sizes)):
+                cases.append((name, setup, unit, modules, {'rows': rows}, (rows,)))
+        for name, (setup, unit, modules) in ESCAPE_CASES.items():
+            for rows, cols in escape_sizes:
+                for escape in (False, True):
+                    cases.append((name, setup, unit, modules,
+                                  {'rows': rows, 'cols': cols, 'escape': escape},
+                                  (rows, cols)))
+        for name, (setup, unit, modules) in IMAGE_CASES.items():
+            for size in (mat_sizes if name == 'write_mat' else image_sizes):
+                cases.append((name, setup, unit, modules,
+                              {'size': size}, (size, directory)))
+        for policy in FLUSH_POLICIES:
+            for tables, rows in flush_sizes:
+                cases.append(('tables', bench_tables, 'tables/s', [],
+                              {'tables': tables, 'rows': rows, 'flush': policy},
+                              (tables, rows)))
+
+        for name, setup, unit, modules, params, args in cases:
+            label = ' '.join(k + '=' + str(v) for k, v in params.items())
+            if not available(modules):
+                results.append({'case': name, 'params': params,
+                                'skipped': 'needs ' + ', '.join(modules)})
+                print('{:<18s} {:<40s} skipped'.format(name, label))
+                continue
+
+            options = {}
+            if 'escape' in params:
+                options['escape'] = params['escape']
+            if 'flush' in params:
+                options['flush'] = FLUSH_POLICIES[params['flush']]()
+            seconds, peak, units, size = measure(setup, args, directory, repeat, options)
+            results.append({'case': name, 'params': params, 'seconds': seconds,
+                            'throughput': units / seconds, 'unit': unit,
+                            'peak_bytes': peak, 'output_bytes': size})
+            print('{:<18s} {:<40s} {:>10.4f} {:>10.3g} {:<8s} {:>9.1f}'.format(
+                  name, label, seconds, units / seconds, unit, peak / 1e6))
+
+    return results
+
+def compare(old_name, new_name, threshold):
+    """ Prints the ratio new/old of time and peak memory of each case
+
+    Returns the number of cases that became slower than threshold.
+    """
+    with open(old_name) as f:
+        old = json.load(f)
+    with open(new_name) as f:
+        new = json.load(f)
+
+    key = lambda r: (r['case'], json.dumps(r['params'], sort_keys=True))
+    old_results = {key(r): r for r in old['results'] if 'seconds' in r}
+
+    print('{:<18s} {:<40s} {:>10s} {:>10s}'.format('case', 'params', 'time', 'memory'))
+    regressions = 0
+    for r in new['results']:
+        o = old_results.get(key(r))
+        if o is None or 'seconds' not in r:
+            continue
+
+        ratio = r['seconds'] / o['seconds']
+        memory = ''
+        if 'peak_bytes' in r and o.get('peak_bytes'):
+            memory = '{:.2f}x'.format(r['peak_bytes'] / o['peak_bytes'])
+        flag = ''
+        if ratio > threshold:
+            flag = '  slower'
+            regressions += 1
+        label = ' '.join(k + '=' + str(v) for k, v in r['params'].items())
+        print('{:<18s} {:<40s} {:>9.2f}x {:>10s}{}'.format(r['case'], label,
+                                                           ratio, memory, flag))
+
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmarks of TableWriter')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--quick', action='store_true', help='small sizes only')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per case, the best time is kept')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two JSON result files')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='time ratio above which --compare reports a case as slower')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(args.compare[0], args.compare[1], args.threshold) > 0 else 0)
+
+    results = run_all(args.quick, args.repeat)
+    if args.output:
+        report = {'version': htmltables.__version__,
+                  'python': platform.python_version(),
+                  'platform': platform.platform(),
+                  'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                  'results': results}
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
@@ -23,9 +23,13 @@ WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR
 IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 from .htmltables import TableWriter
+from .backends import ImagePolicy, register_backend, get_backend
+from .streams import FlushPolicy
+from .escape import Raw
+from .cache import FragmentCache
+from .aggregate import Aggregator
 
 __version__ = '0.3.0'
 
-print('Initializing the htmltables package')
-
-__all__ = ['TableWriter']
\ No newline at end of file
+__all__ = ['TableWriter', 'Aggregator', 'FlushPolicy', 'FragmentCache', 'ImagePolicy',
+           'Raw', 'register_backend', 'get_backend']
\ No newline at end of file
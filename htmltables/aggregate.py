@@ -0,0 +1,290 @@
+"""
+MIT License
+
+Copyright (c) 2019 Arnold Reinders
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+""" Writes the rows of several worker processes into one table
+
+An Aggregator owns a table of a TableWriter in the main process. Workers
+get a WorkerProxy with the row, rows, p and write_dict methods, which
+sends the rows in batches over a multiprocessing queue; a thread of the
+Aggregator writes them to the table.
+"""
+import time
+import tempfile
+import threading
+
+from .escape import Raw, shared_escaper
+
+class WorkerProxy(object):
+    """ Sends rows, text and dicts of a worker to an Aggregator
+
+    Rows are collected and sent batch_size at a time, or when max_delay
+    seconds have passed since the last batch. close() sends the rows still
+    collected; use the proxy as a context manager or call close() before
+    the worker ends, or these rows are lost.
+    """
+    def __init__(self, queue, batch_size=256, max_delay=1.0, render=True,
+                 escape=True):
+        """ Creates a proxy sending to queue, see Aggregator.proxy()
+
+        Args:
+            queue: the queue read by the Aggregator
+            batch_size (int): number of rows sent at a time
+            max_delay (float): seconds after which collected rows are sent
+                with the next row, even when there are less than batch_size
+            render (bool): when True cells are formatted (and escaped) by
+                the worker and sent as Raw strings, when False the cells
+                are sent as they are and must be picklable
+            escape (bool): render mode: escape the cells as HTML
+        """
+        self.queue = queue
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.render = render
+        self.escape = escape
+        self.batch = []
+        self.sent = time.monotonic()
+
+        return
+
+    def __getstate__(self):
+        # a proxy is passed to a worker without its collected rows
+        state = dict(self.__dict__)
+        state['batch'] = []
+
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+        return
+
+    def row(self, row_list):
+        """ Adds a row to the table of the Aggregator
+        """
+        if self.render:
+            if self.escape:
+                row_list = [Raw(shared_escaper.escape(cell)) for cell in row_list]
+            else:
+                row_list = [Raw(cell) for cell in row_list]
+
+        self.batch.append(row_list)
+        if len(self.batch) >= self.batch_size or \
+           time.monotonic() - self.sent >= self.max_delay:
+            self.flush()
+
+        return self
+
+    def rows(self, row_lists):
+        for row_list in row_lists:
+            self.row(row_list)
+
+        return self
+
+    def p(self, text, tag='p'):
+        """ Writes text after the table, see Aggregator
+        """
+        self.queue.put(('p', text, tag))
+
+        return
+
+    def write_dict(self, dict, **kwargs):
+        """ Writes a dict as table after the table, see Aggregator
+
+        Args:
+            dict: dict or iterable of (key, value) pairs
+            kwargs: the other arguments of TableWriter.write_dict
+        """
+        items = list(dict.items()) if hasattr(dict, 'items') else list(dict)
+        self.queue.put(('dict', items, kwargs))
+
+        return
+
+    def flush(self):
+        """ Sends the collected rows
+        """
+        if len(self.batch) > 0:
+            self.queue.put(('rows', self.batch))
+            self.batch = []
+        self.sent = time.monotonic()
+
+        return
+
+    def close(self):
+        self.flush()
+
+        return
+
+class Aggregator(object):
+    """ Writes the rows sent by worker processes into one table
+
+    Method of use:
+
+        with TableWriter(...) as html:
+            with Aggregator(html, ['lr', 'loss']) as aggregator:
+                workers = [multiprocessing.Process(target=sweep,
+                                                   args=(aggregator.proxy(), lr))
+                           for lr in rates]
+                    :
+                # start and join the workers
+
+        def sweep(proxy, lr):
+            with proxy:
+                proxy.row([lr, train(lr)])
+
+    The table is entered with the Aggregator and exited with it, after
+    all rows have been received. Rows are written in order of arrival,
+    or sorted by sort_key when the Aggregator exits; sorting keeps all
+    rows in memory until then. Text and dicts sent with p and write_dict
+    are written after the table, in order of arrival. While the
+    Aggregator is open, nothing else should be written to the writer.
+
+    The default queue can be passed to processes when they are created;
+    for a process pool pass the queue of a multiprocessing Manager.
+    """
+    def __init__(self, writer, headers, align=["left"], hcolors=None,
+                 colors=["white","black"], sort_key=None, queue=None,
+                 queue_size=1024, batch_size=256, max_delay=1.0, render=True):
+        """ Creates an Aggregator for writer
+
+        Args:
+            writer (TableWriter): the open writer to write to
+            headers (list of str): headers of the table
+            sort_key (callable): when given the rows are sorted by this
+                key, which gets a row as sent by the workers: a list of
+                str in render mode, of the original cells otherwise
+            queue: queue to receive from, None for a multiprocessing
+                Queue of at most queue_size batches
+            batch_size, max_delay, render: see WorkerProxy
+            * other parameters are those of TableWriter.write_table
+        """
+        if queue is None:
+            import multiprocessing
+
+            queue = multiprocessing.get_context().Queue(queue_size)
+
+        self.writer = writer
+        self.headers = headers
+        self.align = align
+        self.hcolors = hcolors
+        self.colors = colors
+        self.sort_key = sort_key
+        self.queue = queue
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.render = render
+        self.table = None
+        self.thread = None
+        self.pending = []
+        self.after = None
+        self.error = None
+
+        return
+
+    def proxy(self):
+        """ Returns a WorkerProxy to pass to a worker
+        """
+        return WorkerProxy(self.queue, self.batch_size, self.max_delay,
+                           self.render, self.writer.escaper is not None)
+
+    def __enter__(self):
+        """ Enters the table and starts receiving
+        """
+        self.writer.declare_colors(self.colors)
+        self.table = self.writer.Table(self.headers, align=self.align,
+                                       hcolors=self.hcolors)
+        self.table.__enter__()
+        self.thread = threading.Thread(target=self.run, daemon=True,
+                                       name='htmltables-aggregator')
+        self.thread.start()
+
+        return self
+
+    def run(self):
+        """ Handles the messages of the queue until None is received
+        """
+        while True:
+            message = self.queue.get()
+            if message is None:
+                return
+
+            try:
+                self.handle(message)
+            except Exception as e:
+                if self.error is None:
+                    self.error = e
+
+    def handle(self, message):
+        if message[0] == 'rows':
+            if self.sort_key is not None:
+                self.pending.extend(message[1])
+            else:
+                self.table.rows(message[1], self.colors)
+        else:
+            if self.after is None:
+                # text and dicts wait in a temporary file until the table
+                # is complete
+                from .htmltables import TableWriter
+
+                self.after = TableWriter(tempfile.TemporaryFile('w+', encoding='utf-8'),
+                                         css=self.writer.css, document=False,
+                                         escape=self.writer.escaper is not None)
+                self.after.__enter__()
+
+            if message[0] == 'p':
+                self.after.p(message[1], message[2])
+            else:
+                self.after.write_dict(message[1], **message[2])
+
+        return
+
+    def __exit__(self, type, value, traceback):
+        """ Waits for the messages sent so far, exits the table and writes
+            the text and dicts
+
+        Raises the first exception raised while writing a message.
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+        if self.sort_key is not None:
+            self.table.rows(sorted(self.pending, key=self.sort_key), self.colors)
+            self.pending = []
+        self.table.__exit__(type, value, traceback)
+
+        if self.after is not None:
+            self.after.close()
+            f = self.after.stream
+            f.seek(0)
+            with self.writer.atomic():
+                for chunk in iter(lambda: f.read(1 << 20), ''):
+                    self.writer.write (chunk)
+            f.close()
+            self.after = None
+
+        if self.error is not None:
+            raise self.error
+
+        return
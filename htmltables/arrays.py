@@ -0,0 +1,139 @@
+"""
+MIT License
+
+Copyright (c) 2019 Arnold Reinders
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+""" Formats NumPy arrays and Arrow tables column by column
+
+Neither numpy nor pyarrow is imported by this module: an object can
+only be one of their arrays when the package has been imported by
+whoever created it, so they are looked up in sys.modules.
+"""
+import sys
+
+from .escape import as_text
+
+# rows formatted at a time, bounds the memory taken by the strings
+CHUNK_ROWS = 16384
+
+def is_array(data):
+    """ Returns True for a 1-D or 2-D ndarray, a structured array, an
+        Arrow Table or an Arrow RecordBatch
+
+    Other objects with a dtype, such as tensors, are not arrays; their
+    rows are written as any other iterable.
+    """
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(data, numpy.ndarray):
+        return not isinstance(data, numpy.matrix) and (data.ndim == 2 or data.ndim == 1)
+
+    pyarrow = sys.modules.get('pyarrow')
+
+    return pyarrow is not None and isinstance(data, (pyarrow.Table, pyarrow.RecordBatch))
+
+def is_structured(data):
+    return hasattr(data, 'dtype') and getattr(data.dtype, 'names', None) is not None
+
+def array_headers(data):
+    """ Returns the column names of data: the fields of a structured array
+        or the names in the schema of an Arrow table; None for other arrays
+    """
+    if hasattr(data, 'schema'):
+        return list(data.schema.names)
+
+    if is_structured(data):
+        return list(data.dtype.names)
+
+    return None
+
+def array_length(data):
+    if hasattr(data, 'schema'):
+        return data.num_rows
+
+    return data.shape[0]
+
+def array_columns(data, start=0, stop=None):
+    """ Formats rows start up to stop of data, column by column
+
+    Each cell is formatted as str() formats the cell when iterating
+    over the rows of data.
+
+    Returns:
+        list of list of str, one list for each column
+    """
+    if stop is None:
+        stop = array_length(data)
+
+    if hasattr(data, 'schema'):
+        part = data.slice(start, stop - start)
+
+        return [arrow_strings(part.column(i)) for i in range(part.num_columns)]
+
+    part = data[start:stop]
+    if is_structured(part):
+        return [column_strings(part[name]) for name in part.dtype.names]
+
+    if part.ndim == 1:
+        return [column_strings(part)]
+
+    return [column_strings(part[:, i]) for i in range(part.shape[1])]
+
+def column_strings(column):
+    """ Returns the cells of a 1-D ndarray formatted as str
+
+    tolist() converts a column to python scalars at once; these format
+    the same as the numpy scalars yielded when iterating only for the
+    dtypes below, e.g. not for float32 and datetime64. Raw cells of
+    object columns are kept as they are.
+    """
+    dtype = column.dtype
+    if dtype.kind == 'O' and column.ndim == 1:
+        # keeps Raw cells
+        return list(map(as_text, column.tolist()))
+
+    if column.ndim == 1 and (dtype.kind in 'biuUS' or
+                             (dtype.kind == 'f' and dtype.itemsize == 8) or
+                             (dtype.kind == 'c' and dtype.itemsize == 16)):
+        return list(map(str, column.tolist()))
+
+    return list(map(str, column))
+
+def arrow_strings(column):
+    """ Returns the cells of an Arrow Array or ChunkedArray formatted as str
+
+    Numeric columns are formatted from their buffer as a numpy array,
+    with or without nulls, so that e.g. float32 cells format the same as
+    in an ndarray. Other columns are formatted as python objects. Nulls
+    are formatted as None.
+    """
+    import pyarrow.compute
+    import pyarrow.types
+
+    if pyarrow.types.is_integer(column.type) or pyarrow.types.is_floating(column.type):
+        if column.null_count == 0:
+            return column_strings(column.to_numpy())
+
+        strings = column_strings(column.fill_null(0).to_numpy())
+        valid = pyarrow.compute.is_valid(column).to_numpy(zero_copy_only=False)
+
+        return [text if ok else 'None' for text, ok in zip(strings, valid.tolist())]
+
+    return list(map(str, column.to_pylist()))
@@ -0,0 +1,492 @@
+"""
+MIT License
+
+Copyright (c) 2019 Arnold Reinders
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import io
+import os
+import pickle
+import threading
+import collections
+
+# image formats that take a quality
+LOSSY_FORMATS = ('jpg', 'jpeg', 'webp')
+
+# mime type of each image format
+MIME_TYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg',
+              'webp': 'image/webp', 'gif': 'image/gif'}
+
+def jpeg_ready(image, fmt):
+    """ Returns the PIL image converted to RGB when it is saved as jpeg
+        and has an alpha channel or a palette, which jpeg does not support
+    """
+    if fmt in ('jpg', 'jpeg') and getattr(image, 'mode', 'RGB') not in ('RGB', 'L', 'CMYK'):
+        return image.convert('RGB')
+
+    return image
+
+class ImagePolicy(object):
+    """ Determines how write_mat, write_img and write_img_inline store images
+
+    Images larger than max_size are scaled down, saved in format with
+    quality, and shown with loading="lazy" so that the browser only loads
+    the images scrolled into view. With link_full the image links to a
+    file of the image at full resolution.
+    """
+    def __init__(self, max_size=None, format=None, quality=None,
+                 link_full=False, lazy=True):
+        """ Defines an image policy
+
+        Args:
+            max_size (int or tuple): maximum (width, height) in pixels, or
+                the maximum of both; None keeps the size
+            format (str): 'png', 'jpeg' or 'webp'; None keeps the format
+                given by the file name, or of the bytes of an inline image
+            quality (int): quality of jpeg and webp images, 1 to 100; None
+                for the default of the encoder
+            link_full (bool): when True a scaled down or converted image
+                links to the image at full resolution
+            lazy (bool): when True images get loading="lazy"
+        """
+        if isinstance(max_size, int):
+            max_size = (max_size, max_size)
+
+        self.max_size = max_size
+        self.format = format
+        self.quality = quality
+        self.link_full = link_full
+        self.lazy = lazy
+
+        return
+
+    def fit(self, width, height):
+        """ Returns the size of a width x height image scaled down to
+            fit max_size, keeping its aspect ratio
+        """
+        if self.max_size is None:
+            return width, height
+
+        scale = min(1.0, self.max_size[0] / width, self.max_size[1] / height)
+
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+    def recodes(self):
+        """ Returns True when images may be scaled or converted
+        """
+        return self.max_size is not None or self.format is not None
+
+class ArrayBackend(object):
+    """ Saves arrays as images with matplotlib, used by write_mat
+
+    matplotlib.image is imported when the backend is first used. Unlike
+    matplotlib.pyplot it does not select a GUI backend.
+    """
+    def __init__(self):
+        from matplotlib import image
+
+        self.image = image
+
+        return
+
+    def size(self, array):
+        """ Returns width and height of the image
+        """
+        return array.shape[1], array.shape[0]
+
+    def save(self, array, fn, fmt, quality=None):
+        if quality is not None and fmt in LOSSY_FORMATS:
+            self.image.imsave(fn, array, format=fmt, pil_kwargs={'quality': quality})
+        else:
+            self.image.imsave(fn, array, format=fmt)
+
+        return
+
+    def resize(self, array, width, height):
+        """ Returns array scaled down to at most width x height
+
+        Blocks of pixels are averaged, the factor being the smallest
+        integer that makes the array fit.
+        """
+        rows, columns = array.shape[0], array.shape[1]
+        factor = max(-(-rows // height), -(-columns // width))
+        if factor <= 1:
+            return array
+
+        rows = rows // factor
+        columns = columns // factor
+        blocks = array[:rows * factor, :columns * factor].reshape(
+                 (rows, factor, columns, factor) + array.shape[2:])
+        scaled = blocks.mean(axis=(1, 3))
+        if array.dtype.kind in 'iub':
+            scaled = scaled.round()
+
+        return scaled.astype(array.dtype)
+
+class ImageBackend(object):
+    """ Saves PIL-style image objects (having size and save()), used by write_img
+    """
+    def size(self, image):
+        return image.size
+
+    def save(self, image, fn, fmt=None, quality=None):
+        image = jpeg_ready(image, os.path.splitext(fn)[1][1:].lower())
+        if quality is None:
+            image.save(fn)
+        else:
+            image.save(fn, quality=quality)
+
+        return
+
+    def resize(self, image, width, height):
+        """ Returns image scaled to width x height, as is when it has no
+            resize() method
+        """
+        if not hasattr(image, 'resize'):
+            return image
+
+        return image.resize((width, height))
+
+    def digest(self, image):
+        """ Returns the sha256 hex digest of the pixels of image
+
+        Returns None when image has no tobytes() method.
+        """
+        import hashlib
+
+        if not hasattr(image, 'tobytes'):
+            return None
+
+        sha = hashlib.sha256()
+        sha.update(repr((getattr(image, 'mode', None), image.size)).encode())
+        sha.update(image.tobytes())
+
+        return sha.hexdigest()
+
+class BytesBackend(object):
+    """ Encodes raw image bytes as base64, used by write_img_inline
+
+    The image can be bytes, a bytes-like object such as a memoryview, a
+    binary file object or the path of a file. Files given by path are
+    memory mapped. chunks() encodes the image piece by piece so that
+    memory use does not depend on the size of the image.
+    """
+    # bytes per piece, a multiple of 3 so the pieces can be concatenated
+    CHUNK_SIZE = 3 * 65536
+
+    # first bytes of the encodings of image formats
+    SIGNATURES = [(b'\x89PNG', 'png'), (b'\xff\xd8\xff', 'jpg'), (b'GIF8', 'gif')]
+
+    def __init__(self):
+        import base64
+
+        self.base64 = base64
+
+        return
+
+    def encode(self, data):
+        return ''.join(self.chunks(data))
+
+    def chunks(self, source, chunk_size=CHUNK_SIZE):
+        """ Yields the base64 encoding of source as str pieces
+
+        Args:
+            source: bytes-like object, binary file object or path
+            chunk_size (int): number of bytes encoded per piece, rounded
+                down to a multiple of 3
+
+        Yields:
+            str, the encoding of at most chunk_size bytes
+        """
+        for piece in self.pieces(source, chunk_size):
+            yield self.base64.b64encode(piece).decode('ascii')
+
+        return
+
+    def image_format(self, source):
+        """ Returns the format of the encoded image source, found from its
+            first bytes: 'png', 'jpg', 'gif' or 'webp'
+
+        A file object is read and then positioned back where it was.
+        Returns 'png' when the format is not recognized or when the file
+        object cannot seek.
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f:
+                head = f.read(12)
+        elif hasattr(source, 'read'):
+            if not (hasattr(source, 'seekable') and source.seekable()):
+                return 'png'
+            position = source.tell()
+            head = source.read(12)
+            source.seek(position)
+        else:
+            head = bytes(memoryview(source).cast('B')[:12])
+
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            return 'webp'
+
+        for signature, fmt in BytesBackend.SIGNATURES:
+            if head.startswith(signature):
+                return fmt
+
+        return 'png'
+
+    def digest(self, source):
+        """ Returns the sha256 hex digest of the bytes of source
+
+        A file object is read and then positioned back where it was.
+        Returns None for file objects that cannot seek.
+        """
+        import hashlib
+
+        if hasattr(source, 'read'):
+            if not (hasattr(source, 'seekable') and source.seekable()):
+                return None
+            position = source.tell()
+
+        sha = hashlib.sha256()
+        for piece in self.pieces(source):
+            sha.update(piece)
+
+        if hasattr(source, 'read'):
+            source.seek(position)
+
+        return sha.hexdigest()
+
+    def recode(self, source, policy):
+        """ Scales down and converts an encoded image as set by policy
+
+        The image is decoded and encoded again with PIL, which is
+        imported on first use.
+
+        Args:
+            source: bytes-like object, binary file object or path
+            policy (ImagePolicy): the maximum size, format and quality
+
+        Returns:
+            bytes of the image, its format, width and height
+        """
+        from PIL import Image
+
+        if isinstance(source, (str, os.PathLike)) or hasattr(source, 'read'):
+            image = Image.open(source)
+        else:
+            image = Image.open(io.BytesIO(memoryview(source).cast('B')))
+
+        fmt = (policy.format or image.format or 'png').lower()
+        width, height = policy.fit(*image.size)
+        if (width, height) != image.size:
+            image = image.resize((width, height))
+
+        image = jpeg_ready(image, fmt)
+        options = {} if policy.quality is None else {'quality': policy.quality}
+        data = io.BytesIO()
+        image.save(data, 'jpeg' if fmt == 'jpg' else fmt, **options)
+
+        return data.getvalue(), fmt, width, height
+
+    def save(self, source, fn):
+        """ Writes the bytes of source to file fn
+        """
+        with open(fn, 'wb') as f:
+            for piece in self.pieces(source):
+                f.write(piece)
+
+        return
+
+    def pieces(self, source, chunk_size=CHUNK_SIZE):
+        """ Yields the bytes of source in pieces of chunk_size bytes
+
+        chunk_size is rounded down to a multiple of 3 and all pieces but
+        the last are a multiple of 3 bytes long, so their base64 encodings
+        can be concatenated.
+        """
+        chunk_size = max(3, chunk_size - chunk_size % 3)
+
+        if isinstance(source, (str, os.PathLike)):
+            yield from self.path_pieces(source, chunk_size)
+        elif hasattr(source, 'read'):
+            yield from self.file_pieces(source, chunk_size)
+        else:
+            view = memoryview(source).cast('B')
+            for start in range(0, len(view), chunk_size):
+                yield view[start:start + chunk_size]
+
+        return
+
+    def path_pieces(self, path, chunk_size):
+        import mmap
+
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for start in range(0, len(mapped), chunk_size):
+                    yield mapped[start:start + chunk_size]
+
+        return
+
+    def file_pieces(self, f, chunk_size):
+        # read() may return less than asked, keep the bytes that do not
+        # make up a multiple of 3 for the next piece
+        rest = b''
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+
+            data = rest + data
+            n = len(data) - len(data) % 3
+            rest = data[n:]
+            if n > 0:
+                yield data[:n]
+
+        if len(rest) > 0:
+            yield rest
+
+        return
+
+def save_in_worker(name, image, fn, fmt, quality=None):
+    """ Saves image with backend name, run in a worker process
+
+    image is the pickle of the image taken by EncoderPool.submit
+    """
+    image = pickle.loads(image)
+    if quality is None:
+        get_backend(name).save(image, fn, fmt)
+    else:
+        get_backend(name).save(image, fn, fmt, quality)
+
+    return fn
+
+class EncoderPool(object):
+    """ Saves images in worker processes
+
+    Images are pickled to a process pool and saved there, so compressing
+    them uses all cores. At most max_pending saves are pending at any
+    time; submit() waits for the oldest one when that limit is reached,
+    which also bounds the memory taken by the pickled images.
+
+    Images are pickled when submitted, so the caller may change or reuse
+    an image as soon as submit() returns.
+
+    Backends are created anew in the workers; a backend registered with
+    register_backend is only known to them when the pool forks.
+    """
+    def __init__(self, workers=None, max_pending=None):
+        """ Initializes the pool, processes are started on first use
+
+        Args:
+            workers (int): number of worker processes, None for the
+                number of cores
+            max_pending (int): maximum number of pending saves, None for
+                twice the number of workers
+        """
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.max_pending = max_pending if max_pending is not None else 2 * self.workers
+        self.executor = None
+        self.pending = collections.deque()
+        self.lock = threading.Lock()
+
+        return
+
+    def submit(self, name, image, fn, fmt=None, quality=None):
+        """ Saves image as fn with backend name in a worker process
+        """
+        # the executor pickles later, from its own thread
+        image = pickle.dumps(image, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            if self.executor is None:
+                from concurrent.futures import ProcessPoolExecutor
+
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+            while len(self.pending) >= self.max_pending:
+                self.pending.popleft().result()
+
+            self.pending.append(self.executor.submit(save_in_worker, name,
+                                                     image, fn, fmt, quality))
+
+        return
+
+    def wait(self):
+        """ Waits until all images have been saved
+
+        Raises the first exception raised by a save.
+        """
+        with self.lock:
+            while len(self.pending) > 0:
+                self.pending.popleft().result()
+
+        return
+
+    def close(self):
+        """ Waits for all saves and stops the worker processes
+        """
+        try:
+            self.wait()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+        return
+
+# name -> class or function returning the backend, see register_backend
+factories = {'array': ArrayBackend,
+             'image': ImageBackend,
+             'bytes': BytesBackend}
+resolved = {}
+lock = threading.Lock()
+
+def register_backend(name, factory):
+    """ Registers a factory for a backend, replacing the existing one
+
+    The factory is called when the backend is first requested, so any
+    imports it needs are delayed until then.
+
+    Args:
+        name (str): name of the backend: 'array', 'image' or 'bytes'
+        factory (callable): returns an object with the methods of the
+            backend it replaces
+    """
+    with lock:
+        factories[name] = factory
+        resolved.pop(name, None)
+
+    return
+
+def get_backend(name):
+    """ Returns the backend registered as name, creating it on first use
+
+    Raises:
+        KeyError when no backend has been registered as name
+    """
+    backend = resolved.get(name)
+    if backend is None:
+        with lock:
+            backend = resolved.get(name)
+            if backend is None:
+                backend = factories[name]()
+                resolved[name] = backend
+
+    return backend
@@ -0,0 +1,285 @@
+"""
+MIT License
+
+Copyright (c) 2019 Arnold Reinders
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import numbers
+import hashlib
+import threading
+import collections
+
+from .escape import Raw
+
+class ImageCache(object):
+    """ Remembers where the content of an image was written before
+
+    Maps the content digest of an image to a reference to its first copy,
+    e.g. the id of an embedded image or the name of a file. The cache holds
+    at most max_entries references; when full, the least recently used
+    reference is evicted and the next image with that content is written
+    in full again.
+    """
+    def __init__(self, max_entries=1024):
+        """ Creates an empty cache
+
+        Args:
+            max_entries (int): maximum number of references kept
+        """
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        return
+
+    def get(self, digest):
+        """ Returns the reference stored for digest or None
+        """
+        with self.lock:
+            reference = self.entries.get(digest)
+            if reference is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(digest)
+
+        return reference
+
+    def put(self, digest, reference):
+        """ Stores reference for digest, evicting the least recently used
+        """
+        with self.lock:
+            self.entries[digest] = reference
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+        return
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+        return
+
+    def __len__(self):
+        return len(self.entries)
+
+class FragmentCache(object):
+    """ Keeps the html of tables on disk, keyed by a hash of their input
+
+    Each fragment is a file named after its key in directory. The cache
+    holds at most max_bytes; when more is stored the least recently used
+    fragments are removed. Several writers and processes can share a
+    directory: fragments are written to a temporary file first and then
+    renamed.
+    """
+    # part of every key; changed when the html of tables changes
+    FORMAT = 1
+
+    def __init__(self, directory, max_bytes=256 << 20):
+        """ Uses directory as cache, creating it when it does not exist
+
+        Args:
+            directory (str): directory of the fragment files
+            max_bytes (int): maximum size of all fragments together
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+        return
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.html')
+
+    def get(self, key):
+        """ Returns the path of the fragment of key, None when not cached
+        """
+        path = self.path(key)
+        try:
+            # the modification time orders the fragments for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        return path
+
+    def create(self, key):
+        """ Returns a new temporary file for the fragment of key, see commit()
+        """
+        name = self.path(key) + '.' + str(os.getpid()) + '-' + \
+               str(threading.get_ident()) + '.tmp'
+
+        return open(name, 'w', encoding='utf-8')
+
+    def commit(self, key, f, keep=True):
+        """ Closes f, stores it as the fragment of key when keep is True
+
+        Fragments are evicted when the cache holds more than max_bytes.
+        """
+        f.close()
+        if not keep:
+            os.remove(f.name)
+            return
+
+        os.replace(f.name, self.path(key))
+        self.evict()
+
+        return
+
+    def evict(self):
+        """ Removes the least recently used fragments until at most
+            max_bytes are stored
+        """
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.html'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        return
+
+    def invalidate(self, key=None):
+        """ Removes the fragment of key, or all fragments when key is None
+        """
+        if key is not None:
+            paths = [self.path(key)]
+        else:
+            paths = [os.path.join(self.directory, name)
+                     for name in os.listdir(self.directory)
+                     if name.endswith('.html')]
+
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        return
+
+    def key(self, *parts):
+        """ Returns the key of a fragment made from parts, the repr of which
+            must identify its content
+        """
+        return hashlib.sha256(repr((FragmentCache.FORMAT,) + parts).encode()).hexdigest()
+
+# cell values whose repr identifies their str
+PLAIN_TYPES = {str, int, float, bool, type(None)}
+
+def plain(value):
+    cls = type(value)
+    if cls in PLAIN_TYPES:
+        return True
+
+    # Raw has the repr of a str, but is written differently
+    return cls is not Raw and isinstance(value, numbers.Number)
+
+def content_digest(data):
+    """ Returns the sha256 hex digest of the content of table data
+
+    data can be a DataFrame, an ndarray, an Arrow table, a dict or a list
+    of rows. Returns None when the content cannot be hashed reliably, e.g.
+    for cells that are not strings or numbers, whose repr may be
+    abbreviated, or for Raw cells.
+    """
+    sha = hashlib.sha256()
+    if hasattr(data, 'schema') and hasattr(data, 'num_rows'):
+        # Arrow: the buffers of each array with its offset and length
+        sha.update(str(data.schema).encode())
+        for column in data.columns:
+            for array in getattr(column, 'chunks', [column]):
+                if not arrow_digest(sha, array):
+                    return None
+    elif hasattr(data, 'dtypes') and hasattr(data, 'index'):
+        from pandas.util import hash_pandas_object
+
+        # Raw cells hash as the equal str, but are not escaped
+        for i, dtype in enumerate(data.dtypes):
+            if dtype == object and Raw in set(map(type, data.iloc[:, i].to_numpy())):
+                return None
+
+        try:
+            hashes = hash_pandas_object(data, index=True)
+        except TypeError:
+            return None
+        sha.update(repr((list(data.columns), list(data.index.names),
+                         [str(dtype) for dtype in data.dtypes])).encode())
+        sha.update(hashes.to_numpy().tobytes())
+    elif hasattr(data, 'dtype') and hasattr(data, 'tobytes'):
+        if data.dtype.hasobject:
+            return None
+        sha.update(repr((data.dtype.descr, data.shape)).encode())
+        sha.update(data.tobytes())
+    elif isinstance(data, dict):
+        if not all(plain(key) and plain(value) for key, value in data.items()):
+            return None
+        sha.update(repr(list(data.items())).encode())
+    elif isinstance(data, (list, tuple)):
+        for row in data:
+            if not isinstance(row, (list, tuple)) or not all(map(plain, row)):
+                return None
+        sha.update(repr(data).encode())
+    else:
+        return None
+
+    return sha.hexdigest()
+
+def arrow_digest(sha, array):
+    """ Adds the content of an Arrow array to sha
+
+    Returns False for arrays holding dictionary arrays other than at the
+    top, as their dictionaries are not among the buffers.
+    """
+    sha.update(repr((str(array.type), array.offset, len(array))).encode())
+    for buffer in array.buffers():
+        if buffer is not None:
+            sha.update(buffer)
+
+    if hasattr(array, 'dictionary'):
+        return arrow_digest(sha, array.dictionary)
+
+    return 'dictionary' not in str(array.type)
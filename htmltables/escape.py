@@ -0,0 +1,115 @@
+"""
+MIT License
+
+Copyright (c) 2019 Arnold Reinders
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numbers
+
+class Raw(str):
+    """ A str holding HTML that is written as is, e.g. a link in a cell
+
+    Raw('<a href="x.html">x</a>') is not escaped by a TableWriter.
+    """
+    pass
+
+def as_text(value):
+    """ Returns str(value), or value itself when it is Raw, so that it is
+        still written as is after formatting
+    """
+    return value if type(value) is Raw else str(value)
+
+class Escaper(object):
+    """ Escapes the values of cells and text for use as HTML content
+
+    str(value) is escaped with &amp;, &lt; and &gt;. Numbers are not
+    escaped, their text never contains these characters; Raw values
+    are written as is. Escaped strings are remembered, so that strings
+    occurring many times, like the labels of a column, are escaped once.
+    """
+    def __init__(self, max_entries=4096):
+        """ Creates an escaper with an empty memo
+
+        Args:
+            max_entries (int): maximum number of strings remembered; when
+                full the memo is emptied
+        """
+        self.max_entries = max_entries
+        self.memo = {}
+        # types of which str() needs no escaping
+        self.safe = {int, float, bool, complex, type(None)}
+
+        return
+
+    def escape(self, value):
+        """ Returns str(value) escaped as HTML content
+        """
+        cls = type(value)
+        if cls is str:
+            text = value
+        elif cls in self.safe:
+            return str(value)
+        elif cls is Raw:
+            return value
+        elif isinstance(value, numbers.Number):
+            # e.g. numpy scalars
+            self.safe.add(cls)
+            return str(value)
+        else:
+            text = str(value)
+
+        # the memo is not locked: a lost or duplicate entry does no harm
+        escaped = self.memo.get(text)
+        if escaped is None:
+            escaped = text
+            if '&' in text:
+                escaped = escaped.replace('&', '&amp;')
+            if '<' in text:
+                escaped = escaped.replace('<', '&lt;')
+            if '>' in text:
+                escaped = escaped.replace('>', '&gt;')
+            if len(self.memo) >= self.max_entries:
+                self.memo.clear()
+            self.memo[text] = escaped
+
+        return escaped
+
+    def column(self, values):
+        """ Returns a list of str values escaped as HTML content
+
+        The column is scanned as a whole, so a column without any
+        character to escape, like a column of numbers, is returned as is.
+
+        Args:
+            values (list of str): the formatted cells of a column
+        """
+        try:
+            text = ''.join(values)
+        except TypeError:
+            # not all values are str
+            return [self.escape(value) for value in values]
+
+        if '&' not in text and '<' not in text and '>' not in text:
+            return values
+
+        return [self.escape(value) for value in values]
+
+# used by all writers, so that the memo outlives a writer
+shared_escaper = Escaper()
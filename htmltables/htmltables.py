@@ -22,8 +22,111 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 import os
-import base64
-import matplotlib.pyplot as plt
+import io
+import json
+import contextlib
+import functools
+import threading
+from json.encoder import encode_basestring as encode_string
+
+from .arrays import CHUNK_ROWS, array_columns, array_headers, array_length, is_array
+from .backends import get_backend, EncoderPool, MIME_TYPES
+from .cache import FragmentCache, ImageCache, content_digest
+from .escape import Raw, as_text, shared_escaper
+from .stats import Stats
+from .streams import BackgroundFile, CountingFile, FlushPolicy, PolicyFile, StreamFile, TeeFile
+from .streams import COMPRESSED_EXTENSIONS, open_compressed
+
+class StyleSheet(object):
+    """ Collects the CSS classes used by the class based styling mode
+
+    Each distinct declaration (an alignment or a background/foreground
+    color pair) gets a short class name. Rules that have not been written
+    to the html file yet are pending until style_block() is called.
+    """
+    BASE_RULES = ['table.ht{border:1px solid black;border-collapse:collapse}',
+                  '.ht th,.ht td{border:1px solid black}']
+
+    def __init__(self, suffix=''):
+        """ Creates a style sheet with the classes of the default styles
+
+        Args:
+            suffix (str): appended to all class names, to keep them apart
+                from the classes of another style sheet in the same file
+        """
+        self.suffix = suffix
+        self.classes = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.pending = list(StyleSheet.BASE_RULES)
+        for align in ['left', 'right', 'center']:
+            self.align_class(align)
+        self.color_class('white', 'black')
+
+        return
+
+    def declare(self, prefix, declaration):
+        """ Returns the class name of a declaration, creating it when new
+
+        Args:
+            prefix (str): prefix of the class name
+            declaration (str): CSS declaration of the class
+
+        Returns:
+            the class name (str)
+        """
+        name = self.classes.get(declaration)
+        if name is None:
+            with self.lock:
+                name = self.classes.get(declaration)
+                if name is None:
+                    n = self.counts.get(prefix, 0)
+                    self.counts[prefix] = n + 1
+                    name = prefix + str(n) + self.suffix
+                    self.classes[declaration] = name
+                    self.pending.append('.' + name + '{' + declaration + '}')
+
+        return name
+
+    def align_class(self, align):
+        return self.declare('a', 'text-align:' + str(align))
+
+    def color_class(self, bg, fg):
+        return self.declare('c', 'background-color:' + bg + ';color:' + fg)
+
+    def color_classes(self, colors):
+        """ Declares the classes of the color pairs of alt(colors)
+        """
+        pairs = TableWriter.Table.color_pairs(colors)
+        if pairs is not None:
+            for bg, fg in pairs:
+                self.color_class(bg, fg)
+
+        return
+
+    def restart(self):
+        """ Makes all rules pending again, for a new html file
+        """
+        with self.lock:
+            self.pending = list(StyleSheet.BASE_RULES) + \
+                           ['.' + name + '{' + declaration + '}'
+                            for declaration, name in self.classes.items()]
+
+        return
+
+    def style_block(self):
+        """ Returns a <style> element with all pending rules
+
+        Returns an empty string when no rules are pending.
+        """
+        if len(self.pending) == 0:
+            return ''
+
+        with self.lock:
+            block = '<style>\n' + '\n'.join(self.pending) + '\n</style>\n'
+            self.pending = []
+
+        return block
 
 class TableWriter(object):
     """ TableWriter writes html tables to file together with images and text
@@ -33,8 +136,56 @@ class TableWriter(object):
 
     with TableWriter(...) as html:
         # write tables, images and text using the html file handle
+
+    Each TableWriter owns its file, several writers can be open at the
+    same time, nested or in different threads. With thread_safe=True one
+    writer can be shared by several threads: each table is written to the
+    file as a whole when it is exited.
     """
     HTMLFile = None
+    HTML_OPEN = '<html xmlns="http://www.w3.org/1999/xhtml">\n'
+    BODY_OPEN = '   <body>\n      <div class="body-div" style="font-family: Sans-serif;">\n'
+    HEADER = HTML_OPEN + BODY_OPEN
+    FOOTER = "      </div>\n   </body>\n</html>"
+
+    # renders the rows of virtual tables that are scrolled into view,
+    # written once in the footer of a document with virtual tables
+    VIRTUAL_SCRIPT = '''<script>
+document.querySelectorAll("div.htv").forEach(function (box) {
+   // fragments embedded in one page each render all tables of the page
+   if (box.dataset.rendered) return;
+   box.dataset.rendered = "1";
+   var data = JSON.parse(box.querySelector("script").textContent);
+   var rows = data.rows, body = box.querySelector("tbody"), height = 0;
+   rows.pop();
+   function render() {
+      var first = height ? Math.max(0, Math.floor(box.scrollTop / height) - 20) : 0;
+      var last = Math.min(rows.length, first + (height ? Math.ceil(box.clientHeight / height) + 40 : 50));
+      var html = ['<tr style="height:' + first * height + 'px"></tr>'];
+      for (var r = first; r < last; r++) {
+         var row = rows[r], color = data.colors[row[0]];
+         html.push('<tr>');
+         for (var i = 1; i < row.length; i++)
+            html.push('<td style="border:1px solid black;white-space:nowrap;text-align:' +
+                      data.align[i - 1] + ';background-color:' + color[0] +
+                      ';color:' + color[1] + '">' + row[i] + '</td>');
+         html.push('</tr>');
+      }
+      html.push('<tr style="height:' + (rows.length - last) * height + 'px"></tr>');
+      body.innerHTML = html.join('');
+      if (!height && last > first) {
+         height = body.rows[1].offsetHeight || 20;
+         render();
+      }
+   }
+   box.addEventListener("scroll", function () { window.requestAnimationFrame(render); });
+   render();
+});
+</script>
+'''
+
+    # writers opened by the current thread, innermost last
+    opened = threading.local()
 
     class Table(object):
         """ Class Table creates an HTML table
@@ -47,8 +198,11 @@ class TableWriter(object):
                        :
                     tab.row([list of row elements for row n])
 
+        html.Table is bound to html. A Table created as TableWriter.Table
+        writes to the innermost TableWriter opened by the current thread.
         """
-        def __init__(self, table_headers, align=["left"], hcolors=None):
+        def __init__(self, table_headers, align=["left"], hcolors=None,
+                     writer=None, virtual=False, fragment=None):
             """ Initializes a table
 
             Args:
@@ -58,7 +212,20 @@ class TableWriter(object):
                         is repeated
                 hcolors (list): [background, foreground] color of the header
                     in HTML code
+                writer (TableWriter): the writer the table is written to,
+                    None for the innermost writer opened by this thread
+                virtual (bool): when True the rows are written as a JSON
+                    payload and a script in the footer only renders the
+                    rows scrolled into view; alignments per row are ignored
+                fragment (str): key in the fragment cache of the writer
+                    under which the html of the table is stored when the
+                    table is exited without an exception
             """
+            if writer is None:
+                writer = TableWriter.current()
+
+            self.writer = writer
+            self.out = None
             self.table_headers = table_headers
             self.bg = "white" if hcolors is None else hcolors[0]
             self.fg = "black" if hcolors is None else hcolors[1]
@@ -70,10 +237,28 @@ class TableWriter(object):
                 align.append(last)
 
             self.align = align
-            self.rows = 0
+            self.row_count = 0
             self.row_bg = "white"
             self.row_fg = "black"
 
+            # compiled cell prefixes, one list per (bg, fg) color pair
+            self.templates = {}
+            self.prefixes = None
+            self.css = writer.stylesheet
+            self.escape = writer.escaper.escape if writer.escaper is not None else str
+
+            # virtual mode: the (bg, fg) pairs the rows refer to by index
+            self.virtual = virtual
+            self.colors = []
+            self.fragment = fragment
+            self.fragment_file = None
+            if virtual:
+                self.render_row = self.render_json
+
+            if writer.statistics is not None:
+                writer.statistics.instrument(self, TableWriter.TABLE_METHODS,
+                                             lambda: self.out.total)
+
             return
 
         def __enter__(self):
@@ -83,32 +268,226 @@ class TableWriter(object):
             After this, successive calls to row can be made to add a row
             of data to the table.
             """
-            TableWriter.HTMLFile.flush()
-            TableWriter.HTMLFile.write ('<div class="Table">\n')
-            TableWriter.HTMLFile.write ('<table style="border:1px solid black;border-collapse:collapse;">\n')
-            TableWriter.HTMLFile.write ('   <tr>\n')
-            TableWriter.HTMLFile.write ('   <font color="' + self.fg + '">\n')
-            for i, cell in enumerate(self.table_headers):
-                TableWriter.HTMLFile.write ('      <th align="' + self.align[i] +
-                                    ' "style="border:1px solid black; background-color: ' +
-                                    self.bg + '; color: ' + self.fg + '">')
-                TableWriter.HTMLFile.write (str (cell))
-                TableWriter.HTMLFile.write ('</th>\n')
+            if self.writer.sharded:
+                self.writer.split()
+                self.number = self.writer.begin_table()
+                self.shard_first = 0
+
+            self.prefixes = self.compile(self.row_bg, self.row_fg)
+
+            if self.writer.lock is None:
+                self.out = self.writer.HTMLFile
+                if self.writer.flush_policy.table:
+                    self.out.flush()
+            else:
+                # the table is written as a whole when it is exited
+                self.out = io.StringIO()
+                if self.writer.statistics is not None:
+                    self.out = CountingFile(self.out)
+
+            if self.fragment is not None:
+                self.fragment_file = self.writer.fragment_cache.create(self.fragment)
+                self.out = TeeFile(self.out, self.fragment_file)
+
+            if self.writer.statistics is not None:
+                self.writer.statistics.begin_table(self)
 
-            TableWriter.HTMLFile.write ('   </font>\n   </tr>\n')
+            self.out.write (self.head())
 
             return self
 
+        def head(self):
+            """ Returns the HTML that opens the table, up to its header row
+            """
+            if self.virtual:
+                return self.virtual_head()
+
+            if self.css is None:
+                # 1, 1.0 and True, and Raw('<b>') and '<b>', are equal and
+                # hash the same but are written differently
+                key = (tuple(self.table_headers),
+                       tuple(map(type, self.table_headers)), tuple(self.align),
+                       self.bg, self.fg, self.escape)
+                try:
+                    return TableWriter.Table.inline_head(*key)
+                except TypeError:
+                    # unhashable headers
+                    return TableWriter.Table.inline_head.__wrapped__(*key)
+            else:
+                color = self.css.color_class(self.bg, self.fg)
+                cells = ['      <th class="' + self.css.align_class(self.align[i]) +
+                         ' ' + color + '">' + self.escape(cell) + '</th>\n'
+                         for i, cell in enumerate(self.table_headers)]
+                html = [self.css.style_block(),
+                        '<div class="Table">\n<table class="ht">\n   <tr>\n'] + \
+                       cells + ['   </tr>\n']
+
+            return ''.join(html)
+
+        @staticmethod
+        @functools.lru_cache(maxsize=256, typed=True)
+        def inline_head(headers, types, align, bg, fg, escape):
+            """ Returns the opening HTML of a table with inline styles
+
+            The result is cached, so that a writer rendering the same
+            tables over and over, e.g. per request, builds them once.
+            types, the types of the headers, is only part of the key.
+            """
+            html = ['<div class="Table">\n',
+                    '<table style="border:1px solid black;border-collapse:collapse;">\n',
+                    '   <tr>\n',
+                    '   <font color="' + fg + '">\n']
+            for i, cell in enumerate(headers):
+                html.append('      <th align="' + align[i] +
+                            ' "style="border:1px solid black; background-color: ' +
+                            bg + '; color: ' + fg + '">' +
+                            escape(cell) + '</th>\n')
+
+            html.append('   </font>\n   </tr>\n')
+
+            return ''.join(html)
+
+        def tail(self):
+            """ Returns the HTML that closes the table
+            """
+            if self.virtual:
+                return ('null],\n"align": ' + self.json(self.align) +
+                        ',\n"colors": ' + self.json(self.colors) +
+                        '}</script>\n</div>\n</div>\n')
+
+            if self.css is not None:
+                # colors selected while writing rows
+                return "</table>\n</div>\n" + self.css.style_block()
+
+            return "</table>\n</div>\n"
+
+        def virtual_head(self):
+            """ Returns the HTML that opens a virtual table, up to the start
+                of the rows of its JSON payload
+
+            The payload is {"rows": [[color index, cell, ...], ..., null],
+            "align": [...], "colors": [[bg, fg], ...]}.
+            """
+            # the footer of the document renders the rows
+            self.writer.virtual_tables = True
+
+            html = ['<div class="Table">\n',
+                    '<div class="htv" style="max-height:600px;overflow:auto;">\n',
+                    '<table style="border:1px solid black;border-collapse:collapse;">\n',
+                    '   <thead><tr>\n']
+            for i, cell in enumerate(self.table_headers):
+                html.append('      <th align="' + self.align[i] +
+                            '" style="position:sticky;top:0;border:1px solid black; ' +
+                            'background-color: ' + self.bg + '; color: ' + self.fg +
+                            '">' + self.escape(cell) + '</th>\n')
+            html.append('   </tr></thead>\n   <tbody></tbody>\n</table>\n'
+                        '<script type="application/json">{"rows": [\n')
+
+            return ''.join(html)
+
+        @staticmethod
+        def json(value):
+            """ Returns value as JSON that can be embedded in a <script>
+            """
+            return json.dumps(value).replace('<', '\\u003c')
+
+        def next_shard(self):
+            """ Continues the table in the next shard of a sharded writer
+
+            The table is closed in the current shard and opened again,
+            with its header row, in the next one. The row count and thus
+            the alternation of the row colors continues.
+            """
+            self.writer.shard_table(self.number, self.shard_first, self.row_count)
+            self.out.write (self.tail())
+            self.writer.next_shard()
+            self.out = self.writer.HTMLFile
+            self.out.write (self.head())
+            self.shard_first = self.row_count
+
+            return
+
         def __exit__(self, type, value, traceback):
             """ Writes the table footer.
             """
-            TableWriter.HTMLFile.write ("</table>\n</div>\n")
+            self.out.write (self.tail())
+            if self.writer.statistics is not None:
+                self.writer.statistics.end_table(self)
+            if self.fragment_file is not None:
+                self.writer.fragment_cache.commit(self.fragment, self.fragment_file,
+                                                  keep=traceback is None)
+                self.fragment_file = None
+            if self.writer.sharded:
+                self.writer.shard_table(self.number, self.shard_first, self.row_count)
+                self.writer.end_table()
+
+            if self.writer.lock is not None:
+                self.writer.write (self.out.getvalue())
+                self.out = None
+
+            self.writer.table_written()
+
             if traceback is not None:
                 print(value, 'at line', traceback.tb_lineno)
                 print('Crash:', traceback)
 
             return #self
 
+        def compile(self, bg, fg):
+            """ Returns the <td> prefixes of all columns for a color pair
+
+            The prefixes are built once per color pair and kept in
+            self.templates.
+
+            Args:
+                bg (str): background color in HTML code
+                fg (str): font color in HTML code
+
+            Returns:
+                list of str, one prefix for each column
+            """
+            key = (bg, fg)
+            prefixes = self.templates.get(key)
+            if prefixes is None:
+                prefixes = [self.cell_prefix(align, bg, fg) for align in self.align]
+                self.templates[key] = prefixes
+
+            return prefixes
+
+        def render_row(self, row_list, prefixes):
+            """ Returns the HTML of a row, each cell preceded by its prefix
+            """
+            if len(row_list) > len(prefixes):
+                raise ValueError('Row of ' + str(len(row_list)) +
+                                 ' cells while there are only ' +
+                                 str(len(prefixes)) + ' alignments')
+
+            escape = self.escape
+
+            return ('   <tr>\n' +
+                    ''.join([prefix + escape(cell) + '</td>\n'
+                             for prefix, cell in zip(prefixes, row_list)]) +
+                    '   </tr>\n')
+
+        def render_json(self, row_list, prefixes):
+            """ Returns a row of a virtual table as a JSON array
+
+            The prefixes of a virtual table all are the start of the array
+            holding the index of the row colors, see cell_prefix.
+            """
+            if len(row_list) > len(prefixes):
+                raise ValueError('Row of ' + str(len(row_list)) +
+                                 ' cells while there are only ' +
+                                 str(len(prefixes)) + ' alignments')
+
+            # the cells are HTML; '<' only occurs in strings, where it is
+            # escaped once more for JSON
+            escape = self.escape
+
+            return (prefixes[0] +
+                    ''.join([',' + encode_string(escape(cell)) for cell in row_list]) +
+                    '],\n').replace('<', '\\u003c')
+
         def row (self, row_list, align=None):
             """ Writes a row of data to the table in the html file
 
@@ -120,22 +499,225 @@ class TableWriter(object):
             Returns:
                 self
             """
-            if align is None:
-                align = self.align
-            TableWriter.HTMLFile.write ('   <tr>\n')
-            for i, cell in enumerate(row_list):
-                TableWriter.HTMLFile.write ('      <td align="' + align[i] + ' ' +
-                                    '"style="border:1px solid black' +
-                                    '; text-align: ' + str(align[i]) +
-                                    '; background-color: ' +
-                                    self.row_bg + '; color: ' + self.row_fg + '">')
-                TableWriter.HTMLFile.write (str (cell))
-                TableWriter.HTMLFile.write ('</td>\n')
-            TableWriter.HTMLFile.write ('   </tr>\n')
-            self.rows += 1
+            if self.prefixes is None:
+                self.prefixes = self.compile(self.row_bg, self.row_fg)
+
+            if align is None or align == self.align:
+                prefixes = self.prefixes
+            else:
+                prefixes = [self.cell_prefix(a, self.row_bg, self.row_fg)
+                            for a in align]
+
+            if self.writer.sharded:
+                if self.writer.shard_full():
+                    self.next_shard()
+                self.writer.shard_row_count += 1
+
+            self.out.write (self.render_row(row_list, prefixes))
+            self.row_count += 1
+
+            return self
+
+        def rows(self, row_lists, colors=None, batch_size=1024):
+            """ Writes an iterable of rows to the table
+
+            The rows are rendered in batches of batch_size rows, each batch
+            is written with one write. When colors is specified the row
+            colors alternate as if alt(colors) was called before each row.
+
+            An ndarray, structured array or Arrow table is formatted
+            column by column, see write_array.
+
+            Args:
+                row_lists (iterable): iterable of rows (lists of cells)
+                colors (list): colors as passed to alt(); when None all
+                    rows get the current row colors
+                batch_size (int): number of rows per write
+
+            Returns:
+                self
+            """
+            if is_array(row_lists):
+                return self.write_array(row_lists, colors)
+
+            pairs = self.color_pairs(colors)
+            if pairs is None:
+                pairs = [(self.row_bg, self.row_fg)] * 2
+            compiled = [self.compile(*pairs[0]), self.compile(*pairs[1])]
+
+            buffer = []
+            if self.writer.sharded:
+                buffered = 0
+                for row_list in row_lists:
+                    if self.writer.shard_full(buffered):
+                        self.out.write (''.join(buffer))
+                        buffer = []
+                        buffered = 0
+                        self.next_shard()
+
+                    html = self.render_row(row_list, compiled[self.row_count % 2])
+                    buffer.append(html)
+                    buffered += len(html)
+                    self.row_count += 1
+                    self.writer.shard_row_count += 1
+                    if len(buffer) >= batch_size:
+                        self.out.write (''.join(buffer))
+                        buffer = []
+                        buffered = 0
+            else:
+                for row_list in row_lists:
+                    buffer.append(self.render_row(row_list, compiled[self.row_count % 2]))
+                    self.row_count += 1
+                    if len(buffer) >= batch_size:
+                        self.out.write (''.join(buffer))
+                        buffer = []
+
+            if len(buffer) > 0:
+                self.out.write (''.join(buffer))
+
+            if self.row_count > 0:
+                self.set_colors(*pairs[(self.row_count - 1) % 2])
 
             return self
 
+        def write_columns(self, columns, colors=None, chunk_rows=4096):
+            """ Writes rows of data to the table, column by column
+
+            The result is identical to calling alt(colors).row() for each
+            row, but each column is processed once and the HTML is written
+            in chunks of chunk_rows rows instead of one write per cell.
+
+            Args:
+                columns (list of list of str): one list of formatted cells
+                    per column, all columns should have the same length
+                colors (list): colors as passed to alt(), None keeps the
+                    current row colors for all rows
+                chunk_rows (int): number of rows written to file at once
+
+            Returns:
+                self
+            """
+            n_rows = len(columns[0]) if len(columns) > 0 else 0
+            if n_rows == 0:
+                return self
+
+            if self.writer.sharded or self.virtual:
+                # rows() splits the rows over the shards
+                return self.rows(zip(*columns), colors)
+
+            pairs = self.color_pairs(colors)
+            if pairs is None:
+                pairs = [(self.row_bg, self.row_fg)] * 2
+
+            # a row gets the even pair when the number of rows written
+            # before it is even, exactly as alt() does
+            parity = self.row_count % 2
+            even = self.compile(*pairs[parity])
+            odd = self.compile(*pairs[1 - parity])
+
+            for start in range(0, n_rows, chunk_rows):
+                end = min(start + chunk_rows, n_rows)
+                first = start % 2
+                cells = []
+                for i, column in enumerate(columns):
+                    part = column[start:end]
+                    if self.writer.escaper is not None:
+                        part = self.writer.escaper.column(part)
+                    formatted = [None] * len(part)
+                    formatted[first::2] = [even[i] + str(cell) + '</td>\n'
+                                           for cell in part[first::2]]
+                    formatted[1 - first::2] = [odd[i] + str(cell) + '</td>\n'
+                                               for cell in part[1 - first::2]]
+                    cells.append(formatted)
+
+                chunk = '   </tr>\n   <tr>\n'.join(map(''.join, zip(*cells)))
+                self.out.write ('   <tr>\n' + chunk + '   </tr>\n')
+
+            self.row_count += n_rows
+            self.set_colors(*pairs[(self.row_count - 1) % 2])
+
+            return self
+
+        def write_array(self, data, colors=None):
+            """ Writes the rows of an ndarray, structured array or Arrow table
+
+            The array is formatted column by column from its buffers in
+            chunks of arrays.CHUNK_ROWS rows, without creating a python
+            object per row. The result is identical to calling rows() with
+            the rows of the array.
+
+            Args:
+                data: 1-D or 2-D ndarray, structured array, Arrow Table or
+                    RecordBatch
+                colors (list): colors as passed to alt(), None keeps the
+                    current row colors for all rows
+
+            Returns:
+                self
+            """
+            n_rows = array_length(data)
+            for start in range(0, n_rows, CHUNK_ROWS):
+                self.write_columns(array_columns(data, start, start + CHUNK_ROWS),
+                                   colors)
+
+            return self
+
+        def cell_prefix(self, align, bg, fg):
+            """ Returns the opening <td> tag of a table cell
+
+            Args:
+                align (str): alignment of the cell
+                bg (str): background color in HTML code
+                fg (str): font color in HTML code
+            """
+            if self.virtual:
+                if [bg, fg] not in self.colors:
+                    self.colors.append([bg, fg])
+
+                return '[' + str(self.colors.index([bg, fg]))
+
+            if self.css is not None:
+                return ('      <td class="' + self.css.align_class(align) +
+                        ' ' + self.css.color_class(bg, fg) + '">')
+
+            return TableWriter.Table.inline_prefix(align, bg, fg)
+
+        @staticmethod
+        @functools.lru_cache(maxsize=1024)
+        def inline_prefix(align, bg, fg):
+            """ Returns the opening <td> tag of a cell with inline styles
+            """
+            return ('      <td align="' + align + ' ' +
+                    '"style="border:1px solid black' +
+                    '; text-align: ' + str(align) +
+                    '; background-color: ' + bg + '; color: ' + fg + '">')
+
+        @staticmethod
+        def color_pairs(colors):
+            """ Returns the [(bg, fg), (alt_bg, alt_fg)] pairs used by alt()
+
+            Returns None when colors contains less than two colors.
+            """
+            if colors is None or len(colors) < 2:
+                return None
+
+            bg = colors[0]
+            fg = colors[1]
+            alt_bg = colors[2] if len(colors) > 2 else bg
+            alt_fg = colors[3] if len(colors) > 3 else fg
+
+            return [(bg, fg), (alt_bg, alt_fg)]
+
+        def set_colors(self, bg, fg):
+            """ Sets the colors of the next rows and selects their prefixes
+            """
+            if bg != self.row_bg or fg != self.row_fg or self.prefixes is None:
+                self.row_bg = bg
+                self.row_fg = fg
+                self.prefixes = self.compile(bg, fg)
+
+            return
+
         def alt(self, colors=[]):
             """ Alternates fore- and background colors
 
@@ -152,39 +734,179 @@ class TableWriter(object):
                 alt_bg (str): alternative background color of the header in HTML code
                 alt_fg (str): alternative font color od the heading in HTML code
             """
-            if len(colors) < 2:
+            pairs = self.color_pairs(colors)
+            if pairs is None:
                 return
 
-            bg, fg, alt_bg, alt_fg = None, None, None, None
-            if len(colors) >= 2:
-                bg = colors[0]
-                fg = colors[1]
-                alt_fg = fg
-                alt_bg = bg
-                if len(colors) > 2:
-                    alt_bg = colors[2]
-                    alt_fg = fg
-                if len(colors) > 3:
-                    alt_fg = colors[3]
-
-            if self.rows % 2 == 0:
-                self.row_bg = bg
-                self.row_fg = fg
-            else:
-                self.row_bg = alt_bg
-                self.row_fg = alt_fg
+            self.set_colors(*pairs[self.row_count % 2])
 
             return self
 
     ## Class Table ##
 
-    def __init__(self, file_name):
+    # methods timed when a TableWriter is instrumented
+    TABLE_METHODS = ('row', 'rows', 'write_columns')
+    WRITER_METHODS = ('p', 'write_table', 'write_dict', 'write_dataframe', 'write_array',
+                      'write_img', 'write_img_inline', 'write_mat',
+                      'flush', 'drain')
+
+    def __init__(self, file_name, css=False, thread_safe=False,
+                 background=False, queue_size=64, queue_timeout=None,
+                 dedup_images=None, image_cache_size=1024,
+                 encode_workers=0, max_pending=None,
+                 shard_rows=None, shard_bytes=None, resume=False,
+                 flush=None, instrument=False, stats_hook=None,
+                 compress=None, compress_level=None, escape=True,
+                 document=True, encoding='utf-8', fragment_cache=None,
+                 images=None):
         """ Saves the file name of the html file as an attribute
 
         Args:
-            file_name (str): name of the hrml file
+            file_name (str): name of the hrml file; None writes to memory,
+                see getvalue(); a text or binary file-like object or a
+                socket is written to and left open
+            css (bool): when True cells are styled by short class names
+                defined in a <style> block instead of inline styles
+            thread_safe (bool): when True the writer can be shared by
+                several threads; each call and each table is written
+                to file as a whole
+            background (bool): when True the file is written by a
+                dedicated thread, see streams.BackgroundFile
+            queue_size (int): background mode: maximum number of chunks
+                of 64KiB waiting to be written before writes block
+            queue_timeout (float): background mode: seconds a write
+                waits for room in the queue before raising queue.Full,
+                None waits indefinitely
+            dedup_images (str): None writes each image in full; 'inline'
+                embeds the content of an image once and lets repeats
+                refer to it; 'sidecar' saves each distinct image once in
+                a directory next to the html file and links to it
+            image_cache_size (int): maximum number of distinct images
+                remembered for dedup_images
+            encode_workers (int): when not 0, write_mat and write_img save
+                their images in this many worker processes, None for the
+                number of cores; see backends.EncoderPool
+            max_pending (int): maximum number of images waiting to be
+                saved by the workers, None for twice their number
+            shard_rows (int): when specified the report is split over
+                numbered html files (shards) of at most shard_rows table
+                rows; file_name becomes an index page linking the shards
+            shard_bytes (int): when specified a new shard is started as
+                soon as the current one holds shard_bytes characters
+            resume (bool): when True and file_name exists, new content is
+                appended to it in front of its html footer; the footer is
+                rewritten after each table so the file stays complete
+            flush (FlushPolicy): when to flush the file and sync it to
+                disk, None flushes when a table is entered
+            instrument (bool): when True calls, wall time and characters
+                written are recorded per method and per table, see stats()
+            stats_hook (callable): instrument mode: called with a dict for
+                each call of a writer method and each table written
+            compress (str): None writes plain html; 'gzip', 'bz2', 'lzma'
+                or 'zstd' compresses the file while it is written. Unless
+                flush is given the file is then not flushed per table, as
+                each flush makes the compression worse
+            compress_level (int): compression level, None for the default
+                of the codec
+            escape (bool): when True the text of cells, headers and p is
+                escaped as HTML, except values wrapped in Raw; when False
+                it is written as is
+            document (bool): when True a complete html document is
+                written, when False a bare fragment for embedding in a page
+            encoding (str): encoding of the html written to binary streams
+                and sockets and returned by tobytes()
+            fragment_cache (FragmentCache): when given, or the name of its
+                directory, the html of the tables of write_table,
+                write_dict, write_dataframe and write_array is cached by a
+                hash of their data and styling; unchanged tables are
+                copied from the cache. Not used in css and sharded mode
+            images (ImagePolicy): maximum display size, format and quality
+                of the images of write_img, write_mat and write_img_inline,
+                whether they link to the full image and load lazily; None
+                writes images as given
         """
+        if thread_safe and (shard_rows or shard_bytes):
+            raise ValueError('A sharded TableWriter cannot be thread safe')
+        if resume and (background or shard_rows or shard_bytes):
+            raise ValueError('A resumed TableWriter cannot write in the '
+                             'background or in shards')
+
+        if compress is not None and compress not in COMPRESSED_EXTENSIONS:
+            raise ValueError("compress should be None, 'gzip', 'bz2', 'lzma' "
+                             "or 'zstd', not " + repr(compress))
+        if resume and compress is not None:
+            raise ValueError('A compressed TableWriter cannot be resumed')
+
+        # None writes to memory, other objects are streams
+        self.buffer = None
+        self.stream = None
+        if file_name is None:
+            self.buffer = io.StringIO()
+            self.stream = self.buffer
+        elif not isinstance(file_name, (str, bytes, os.PathLike)):
+            self.stream = file_name
+        if self.stream is not None and (shard_rows or shard_bytes or resume or
+                                        compress is not None or
+                                        dedup_images == 'sidecar'):
+            raise ValueError('A TableWriter writing to memory or to a stream '
+                             'cannot be sharded, resumed, compressed or save '
+                             'sidecar images')
+
+        if dedup_images not in (None, 'inline', 'sidecar'):
+            raise ValueError("dedup_images should be None, 'inline' or "
+                             "'sidecar', not " + repr(dedup_images))
+
         self.file_name = file_name
+        self.css = css
+        self.thread_safe = thread_safe
+        self.background = background
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.dedup_images = dedup_images
+        self.image_cache = None
+        if dedup_images is not None:
+            self.image_cache = ImageCache(image_cache_size)
+        self.image_refs = False
+        self.virtual_tables = False
+        self.escaper = shared_escaper if escape else None
+        self.encoder = None
+        if encode_workers != 0:
+            self.encoder = EncoderPool(encode_workers, max_pending)
+
+        self.shard_rows = shard_rows
+        self.shard_bytes = shard_bytes
+        self.sharded = bool(shard_rows or shard_bytes)
+        self.shards = []
+        self.shard_row_count = 0
+        self.table_count = 0
+        self.tables_open = 0
+        self.resume = resume
+        self.compress = compress
+        self.compress_level = compress_level
+        self.document = document
+        self.encoding = encoding
+        if isinstance(fragment_cache, (str, os.PathLike)):
+            fragment_cache = FragmentCache(fragment_cache)
+        self.fragment_cache = fragment_cache
+        self.image_policy = images
+        if flush is None:
+            flush = FlushPolicy(table=compress is None)
+        self.flush_policy = flush
+        self.HTMLFile = None
+        self.stylesheet = None
+        self.lock = threading.RLock() if thread_safe else None
+
+        # tables created by html.Table write to this writer
+        self.Table = functools.partial(TableWriter.Table, writer=self)
+
+        # the methods are only wrapped when instrumented, so that
+        # otherwise the hot paths are untouched
+        self.statistics = None
+        if instrument or stats_hook is not None:
+            self.statistics = Stats(stats_hook)
+            self.statistics.instrument(self, TableWriter.WRITER_METHODS,
+                                       lambda: self.HTMLFile.total
+                                       if self.HTMLFile is not None else 0)
 
         return
 
@@ -192,10 +914,34 @@ class TableWriter(object):
         """ Opens the file and writes an html header
         """
 
-        TableWriter.HTMLFile = open (self.file_name, "w")
+        resumed = self.resume and os.path.exists(self.file_name)
+        if self.sharded:
+            self.shards = []
+            self.shard_tables = []
+            self.shard_row_count = 0
+            self.HTMLFile = self.open_file(self.shard_name(1))
+        elif resumed:
+            self.HTMLFile = self.reopen_file(self.file_name)
+        else:
+            self.HTMLFile = self.open_file(self.file_name)
+
+        self.stylesheet = None
+        if self.css:
+            # a resumed file already contains classes with the same names,
+            # the page a fragment is embedded in may do so
+            suffix = '-' + os.urandom(2).hex() if resumed or not self.document else ''
+            self.stylesheet = StyleSheet(suffix)
+        if not hasattr(TableWriter.opened, 'writers'):
+            TableWriter.opened.writers = []
+        self.opened_with = TableWriter.opened.writers
+        self.opened_with.append(self)
         self.headers = []
         self.data = []
-        self.write_html_header ()
+        if resumed:
+            if self.stylesheet is not None:
+                self.write (self.stylesheet.style_block())
+        else:
+            self.write_html_header ()
 
         return self
 
@@ -210,16 +956,272 @@ class TableWriter(object):
 
         return #self
 
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, type, value, traceback):
+        if traceback is not None:
+            print(value, 'at line', traceback.tb_lineno)
+            print('Crash:', traceback)
+
+        await self.aclose()
+
+        return
+
+    def open_file(self, file_name):
+        """ Opens file_name for writing, wrapped as the mode requires
+        """
+        policy = self.flush_policy
+        if self.stream is not None:
+            f = StreamFile(self.stream, self.encoding)
+        elif self.compress is not None:
+            f = open_compressed(file_name, self.compress, self.compress_level)
+        elif policy.buffer_size is None:
+            f = open (file_name, "w", newline='\n')
+        else:
+            f = open (file_name, "w", buffering=policy.buffer_size, newline='\n')
+        if self.background:
+            f = BackgroundFile(f, queue_size=self.queue_size,
+                               timeout=self.queue_timeout)
+        if policy.periodic():
+            f = PolicyFile(f, policy)
+        if self.sharded or self.statistics is not None:
+            f = self.counted(f)
+
+        return f
+
+    def reopen_file(self, file_name):
+        """ Opens an existing html file positioned in front of its footer
+
+        Only the end of the file is read to find the footer. When there
+        is no footer, e.g. because the program writing the file crashed,
+        the file is positioned at its end. The footer is found with \n
+        and with \r\n line endings, as written on Windows by versions
+        that did not write \n.
+        """
+        footer = TableWriter.FOOTER.encode()
+        with open (file_name, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            start = max(0, size - 4096)
+            f.seek(start)
+            tail = f.read()
+            index = max(tail.rfind(footer), tail.rfind(footer.replace(b'\n', b'\r\n')))
+
+        policy = self.flush_policy
+        if policy.buffer_size is None:
+            f = open (file_name, "r+", newline='\n')
+        else:
+            f = open (file_name, "r+", buffering=policy.buffer_size, newline='\n')
+        f.seek(size if index < 0 else start + index)
+        if policy.periodic():
+            f = PolicyFile(f, policy)
+        if self.statistics is not None:
+            f = self.counted(f)
+
+        return f
+
+    def counted(self, f):
+        """ Returns f wrapped to count characters, continuing the counts
+            of the current file
+        """
+        previous = self.HTMLFile if isinstance(self.HTMLFile, CountingFile) else None
+
+        return CountingFile(f, previous)
+
+    def table_written(self):
+        """ Called after a table has been written to the file
+        """
+        self.checkpoint()
+        if self.flush_policy.fsync == 'table':
+            self.sync()
+
+        return
+
+    def sync(self):
+        """ Flushes the file and syncs it to disk
+        """
+        with self.atomic():
+            if self.background:
+                self.HTMLFile.fsync()
+            else:
+                self.HTMLFile.flush()
+                os.fsync(self.HTMLFile.fileno())
+
+        return
+
+    def checkpoint(self):
+        """ Writes the html footer and positions the file in front of it
+
+        Makes the file a complete html document while writing can go on.
+        Only has effect for a resume TableWriter; it is called after
+        each table.
+        """
+        if not self.resume:
+            return
+
+        with self.atomic():
+            position = self.HTMLFile.tell()
+            self.write_html_footer ()
+            self.HTMLFile.flush()
+            self.HTMLFile.seek(position)
+
+        return
+
+    def shard_name(self, number):
+        """ Returns the file name of shard number, counting from 1
+        """
+        name = self.file_name
+        suffix = ''
+        if self.compress is not None and \
+           name.endswith(COMPRESSED_EXTENSIONS[self.compress]):
+            # report.html.gz is split in report-0001.html.gz, ...
+            suffix = COMPRESSED_EXTENSIONS[self.compress]
+            name = name[:-len(suffix)]
+        base, ext = os.path.splitext(name)
+
+        return base + '-' + '{:04d}'.format(number) + (ext if ext else '.html') + suffix
+
+    def shard_full(self, pending=0):
+        """ Returns True when the current shard cannot take another row
+
+        Args:
+            pending (int): number of characters not yet written to the
+                shard that will be written to it
+        """
+        if self.shard_rows and self.shard_row_count >= self.shard_rows:
+            return True
+
+        if self.shard_bytes and self.HTMLFile.written + pending >= self.shard_bytes:
+            return True
+
+        return False
+
+    def next_shard(self):
+        """ Closes the current shard and opens the next one
+        """
+        self.write_html_footer ()
+        if self.flush_policy.fsync is not None:
+            self.sync()
+        self.HTMLFile.close ()
+        self.shards.append({'file': self.shard_name(len(self.shards) + 1),
+                            'tables': self.shard_tables})
+
+        self.HTMLFile = self.open_file(self.shard_name(len(self.shards) + 1))
+        self.shard_tables = []
+        self.shard_row_count = 0
+        if self.stylesheet is not None:
+            self.stylesheet.restart()
+        if self.dedup_images == 'inline':
+            # shards cannot refer to images in other shards
+            self.image_cache.clear()
+        self.image_refs = False
+        self.virtual_tables = False
+        self.write_html_header ()
+
+        return
+
+    def split(self):
+        """ Starts a new shard when the current one is full and no table
+            is being written
+        """
+        if self.sharded and self.tables_open == 0 and \
+           self.HTMLFile.written > 0 and self.shard_full():
+            self.next_shard()
+
+        return
+
+    def begin_table(self):
+        """ Returns the number of a table that is entered, counting from 1
+        """
+        self.tables_open += 1
+        self.table_count += 1
+
+        return self.table_count
+
+    def end_table(self):
+        self.tables_open -= 1
+
+        return
+
+    def shard_table(self, number, first, last):
+        """ Records that rows first up to last of table number are in the
+            current shard
+        """
+        if last > first:
+            self.shard_tables.append((number, first, last))
+
+        return
+
+    def write_index(self):
+        """ Writes file_name as index page of the shards
+        """
+        self.sharded = False
+        self.HTMLFile = self.open_file(self.file_name)
+        if self.stylesheet is not None:
+            self.stylesheet.restart()
+        self.image_refs = False
+        self.virtual_tables = False
+        self.write_html_header ()
+        with self.Table(['Page', 'Contents']) as tab:
+            for shard in self.shards:
+                name = os.path.basename(shard['file'])
+                contents = ['Table ' + str(number) + ': rows ' + str(first + 1) +
+                            '-' + str(last) for number, first, last in shard['tables']]
+                tab.row([Raw('<a href="' + name + '">' + name + '</a>'),
+                         Raw('<br>'.join(contents))])
+        self.write_html_footer ()
+        self.HTMLFile.close ()
+        self.sharded = True
+
+        return
+
+    @staticmethod
+    def current():
+        """ Returns the innermost TableWriter opened by the current thread
+        """
+        writers = getattr(TableWriter.opened, 'writers', [])
+        if len(writers) == 0:
+            raise RuntimeError('No TableWriter has been opened by this thread')
+
+        return writers[-1]
+
+    def write(self, text):
+        """ Writes text to the html file, as a whole in thread safe mode
+        """
+        if self.lock is None:
+            self.HTMLFile.write (text)
+        else:
+            with self.lock:
+                self.HTMLFile.write (text)
+
+        return
+
+    def atomic(self):
+        """ Returns a context in which the writes of the current thread
+            are not interleaved with those of other threads
+        """
+        if self.lock is None:
+            return contextlib.nullcontext()
+
+        return self.lock
+
     def set_data (self, data=None, headers=None):
         """ Sets table data and header data if not None
 
         Args:
-            data (table data): assigns data to self.data when not None
-            headers (list of str): assigned to self.headers when not None
+            data (table data): assigns data to self.data when not None;
+                a list or any other iterable of rows, e.g. a generator
+                that is consumed by write_table, an ndarray, a structured
+                array or an Arrow table
+            headers (list of str): assigned to self.headers when not None,
+                when None the names of the fields of a structured array or
+                of the columns of an Arrow table are assigned
         """
 
         if data is not None: self.data = data
         if headers is not None: self.headers = headers
+        elif data is not None and is_array(data) and array_headers(data) is not None:
+            self.headers = array_headers(data)
 
         return
 
@@ -227,9 +1229,20 @@ class TableWriter(object):
         """ Writes standard html header to file
         """
 
-        s = '<html xmlns="http://www.w3.org/1999/xhtml">\n   <body>\n'\
-            '      <div class="body-div" style="font-family: Sans-serif;">\n'
-        TableWriter.HTMLFile.write (s)
+        if not self.document:
+            # a fragment only needs the styles
+            if self.stylesheet is not None:
+                self.write (self.stylesheet.style_block())
+
+            return
+
+        if self.stylesheet is None:
+            s = TableWriter.HEADER
+        else:
+            s = TableWriter.HTML_OPEN + '   <head>\n' +\
+                self.stylesheet.style_block() +\
+                '   </head>\n' + TableWriter.BODY_OPEN
+        self.write (s)
 
         return
 
@@ -237,10 +1250,28 @@ class TableWriter(object):
         """ Writes standard html footer to file
         """
 
-        TableWriter.HTMLFile.write ("      </div>\n   </body>\n</html>")
+        if self.image_refs:
+            # copy the source of each embedded image to its repeats
+            self.write ('<script>\n'
+                'document.querySelectorAll("img[data-image]").forEach(function (e) {\n'
+                '   e.src = document.getElementById("image-" + e.dataset.image).src;\n'
+                '});\n</script>\n')
+        if self.virtual_tables:
+            self.write (TableWriter.VIRTUAL_SCRIPT)
+
+        if self.document:
+            self.write (TableWriter.FOOTER)
 
         return
 
+    def escape(self, value):
+        """ Returns str(value), escaped as HTML unless escape is False
+        """
+        if self.escaper is None:
+            return str(value)
+
+        return self.escaper.escape(value)
+
     def write_table_header (self, headers, align="left", bg="white", fg="black"):
         """ Write self.headers as table headers in the html file
 
@@ -248,15 +1279,21 @@ class TableWriter(object):
             * other parameters are assigned to table attributes
         """
 
-        TableWriter.HTMLFile.write ('   <tr>\n')
-        TableWriter.HTMLFile.write ('   <font color="' + fg + '">\n')
-        for cell in headers:
-            TableWriter.HTMLFile.write ('      <th align="' + align +
-                                ' "style="border:1px solid black; background-color: ' +
-                                bg + '; color: ' + fg + '">')
-            TableWriter.HTMLFile.write (str (cell))
-            TableWriter.HTMLFile.write ('</th>\n')
-        TableWriter.HTMLFile.write ('   </font>\n   </tr>\n')
+        if self.stylesheet is not None:
+            th = '      <th class="' + self.stylesheet.align_class(align) + ' ' + \
+                 self.stylesheet.color_class(bg, fg) + '">'
+            self.write ('   <tr>\n' +
+                ''.join([th + self.escape(cell) + '</th>\n' for cell in headers]) +
+                '   </tr>\n')
+
+            return
+
+        th = '      <th align="' + align + \
+             ' "style="border:1px solid black; background-color: ' + \
+             bg + '; color: ' + fg + '">'
+        self.write ('   <tr>\n' + '   <font color="' + fg + '">\n' +
+                    ''.join([th + self.escape(cell) + '</th>\n' for cell in headers]) +
+                    '   </font>\n   </tr>\n')
 
         return
 
@@ -268,22 +1305,34 @@ class TableWriter(object):
             * other parameters are assigned to table attributes
         """
 
-        TableWriter.HTMLFile.write ('   <tr>\n')
-        for cell in row:
-            TableWriter.HTMLFile.write ('      <td align="' + align + '" style="border:1px solid black;">')
-            TableWriter.HTMLFile.write (str (cell))
-            TableWriter.HTMLFile.write ('</td>\n')
-        TableWriter.HTMLFile.write ('   </tr>\n')
+        if self.stylesheet is not None:
+            td = '      <td class="' + self.stylesheet.align_class(align) + '">'
+            self.write ('   <tr>\n' +
+                ''.join([td + self.escape(cell) + '</td>\n' for cell in row]) +
+                '   </tr>\n')
+
+            return
+
+        td = '      <td align="' + align + '" style="border:1px solid black;">'
+        self.write ('   <tr>\n' +
+                    ''.join([td + self.escape(cell) + '</td>\n' for cell in row]) +
+                    '   </tr>\n')
 
         return
 
     def table_begin(self):
-        TableWriter.HTMLFile.write ('<table style="border:1px solid black;border-collapse:collapse;">\n')
+        if self.stylesheet is not None:
+            self.write (self.stylesheet.style_block() + '<table class="ht">\n')
+        else:
+            self.write ('<table style="border:1px solid black;border-collapse:collapse;">\n')
 
         return
 
     def table_end(self):
-        TableWriter.HTMLFile.write ("</table>\n")
+        if self.stylesheet is not None:
+            self.write ("</table>\n" + self.stylesheet.style_block())
+        else:
+            self.write ("</table>\n")
 
         return
 
@@ -298,10 +1347,31 @@ class TableWriter(object):
 
         return
 
-    def write_table (self, align=["left"], hcolors=None, colors=["black", "white"]):
+    def declare_colors(self, colors):
+        """ Declares the color classes of alt(colors) in css mode
+
+        Declaring them before a table is entered puts their rules in front
+        of the table instead of after it.
+        """
+        if self.stylesheet is not None:
+            self.stylesheet.color_classes(colors)
+
+        return
+
+    def write_table (self, align=["left"], hcolors=None, colors=["black", "white"],
+                     virtual=False, batch_size=1024):
         """ Write self.data and self.headers as table to html file
 
+        self.data can be any iterable of rows, e.g. a generator. Its rows
+        are consumed and written batch_size at a time, so the memory used
+        does not depend on the number of rows (except in thread_safe mode,
+        where a table is written as a whole). A generator can be written
+        once.
+
         Args:
+            virtual (bool): write the rows as JSON rendered by a script,
+                see Table
+            batch_size (int): number of rows rendered per write
             * other parameters are assigned to table attributes
         """
         """
@@ -314,107 +1384,599 @@ class TableWriter(object):
 
         self.table_end()
         """
-        with TableWriter.Table(self.headers, align=align,
-                               hcolors=hcolors) as tab:
+        fragment = self.fragment_key('write_table', self.data, self.headers,
+                                     align, hcolors, colors, virtual)
+        if self.copy_fragment(fragment, virtual):
+            return
+
+        self.declare_colors(colors)
+        with self.Table(self.headers, align=align, hcolors=hcolors,
+                        virtual=virtual, fragment=fragment) as tab:
             if self.data is not None:
-                for row in range (0, len (self.data)):
-                    tab.alt(colors).row (self.data[row], align=align)
+                tab.rows(self.data, colors, batch_size)
 
         return
 
     def write_dict(self, dict, headers=None, align=["left"],
-                   hcolors=None, colors=["white","black"]):
+                   hcolors=None, colors=["white","black"], virtual=False,
+                   batch_size=1024):
+        """ Writes the keys and values of a dict as a table of two columns
+
+        Args:
+            dict: a dict, or any iterable of (key, value) pairs such as a
+                generator; pairs are consumed and written batch_size at a
+                time, see write_table
+            headers (list of str): the two headers, None for Key and Value
+            virtual (bool): write the rows as JSON rendered by a script,
+                see Table
+            batch_size (int): number of rows rendered per write
+            * other parameters are assigned to table attributes
+        """
         if headers is None:
             headers = ['Key', 'Value']
 
-        with TableWriter.Table(headers, align=align,
-                                        hcolors=hcolors) as tab:
-            for key, value in dict.items():
-                tab.alt(colors).row([key, value])
+        fragment = self.fragment_key('write_dict', dict, headers,
+                                     align, hcolors, colors, virtual)
+        if self.copy_fragment(fragment, virtual):
+            return
+
+        self.declare_colors(colors)
+        with self.Table(headers, align=align, hcolors=hcolors,
+                        virtual=virtual, fragment=fragment) as tab:
+            items = dict.items() if hasattr(dict, 'items') else dict
+            tab.rows(([key, value] for key, value in items), colors, batch_size)
 
         return
 
-    def write_dataframe(self, df, align=["left"], hcolors=None, colors=["white","black"]):
-        self.headers = df.columns
-        self.headers = self.headers.insert(0, '')
-        with TableWriter.Table(self.headers, align=align,
-                                        hcolors=hcolors) as tab:
-            for row_index, row in enumerate(df.index):
-                table_row = [str(row)]
-                for cell in df.loc[row]:
-                    table_row.append(str (cell))
+    def write_dataframe(self, df, align=["left"], hcolors=None, colors=["white","black"],
+                        virtual=False):
+        """ Writes a pandas DataFrame as table to the html file
+
+        The index is written as the first, unnamed column. Whenever
+        possible the frame is rendered column by column in chunks of
+        arrays.CHUNK_ROWS rows (see dataframe_columns), otherwise row by row.
+
+        Args:
+            df (DataFrame): the data frame to write
+            virtual (bool): write the rows as JSON rendered by a script,
+                see Table
+            * other parameters are assigned to table attributes
+        """
+        headers = df.columns.insert(0, '')
+        fragment = self.fragment_key('write_dataframe', df, headers,
+                                     align, hcolors, colors, virtual)
+        if self.copy_fragment(fragment, virtual):
+            return
+
+        dtype = self.dataframe_dtype(df)
+        self.declare_colors(colors)
+        with self.Table(headers, align=align, hcolors=hcolors,
+                        virtual=virtual, fragment=fragment) as tab:
+            if dtype is not None:
+                for start in range(0, len(df), CHUNK_ROWS):
+                    tab.write_columns(self.dataframe_columns(df, dtype, start,
+                                                             start + CHUNK_ROWS),
+                                      colors)
+            else:
+                for row_index, row in enumerate(df.index):
+                    table_row = [str(row)]
+                    for cell in df.loc[row]:
+                        table_row.append(as_text (cell))
+
+                    tab.alt(colors).row(table_row)
+
+        return
+
+    def fragment_key(self, method, data, headers, align, *styling):
+        """ Returns the key of a table in the fragment cache
+
+        Returns None when there is no fragment cache, when the html of the
+        table depends on what was written before (css and sharded mode) or
+        when the content of data cannot be hashed, see cache.content_digest.
+
+        Args:
+            method (str): the method writing the table
+            data: the data of the table
+            headers (list): the headers of the table
+            align (list): the alignments as passed to Table
+            styling: the other arguments that determine the html
+        """
+        if self.fragment_cache is None or self.stylesheet is not None or \
+           self.sharded:
+            return None
+
+        digest = content_digest(data)
+        if digest is None:
+            return None
+
+        # Raw headers have the repr of a str but are not escaped
+        headers = [(cell, type(cell) is Raw) for cell in headers]
+
+        # the alignments as Table pads them; Table pads the list passed in
+        # place, so the same default list may have been padded before
+        align = list(align) if align else ['left']
+        align += align[-1:] * (len(headers) - len(align))
+
+        return self.fragment_cache.key(method, digest, headers, align, styling,
+                                       self.escaper is not None)
+
+    def copy_fragment(self, key, virtual=False):
+        """ Copies the cached html of key to the file
+
+        Returns:
+            True when the html was copied, False when it is not cached
+        """
+        if key is None:
+            return False
+
+        path = self.fragment_cache.get(key)
+        if path is None:
+            return False
+
+        try:
+            with open(path, encoding='utf-8') as f:
+                with self.atomic():
+                    for chunk in iter(lambda: f.read(1 << 20), ''):
+                        self.write (chunk)
+        except FileNotFoundError:
+            # evicted meanwhile, before anything was copied
+            return False
+
+        if virtual:
+            self.virtual_tables = True
+        self.table_written()
+
+        return True
+
+    def write_array(self, data, headers=None, align=["left"], hcolors=None,
+                    colors=["white","black"], virtual=False):
+        """ Writes an ndarray, structured array or Arrow table as table
 
-                tab.alt(colors).row(table_row)
+        The array is formatted column by column, see Table.write_array.
+
+        Args:
+            data: 1-D or 2-D ndarray, structured array, Arrow Table or
+                RecordBatch
+            headers (list of str): the column headers; None for the names
+                of the fields of a structured array or of the columns of an
+                Arrow table, or the column numbers of other arrays
+            virtual (bool): write the rows as JSON rendered by a script,
+                see Table
+            * other parameters are assigned to table attributes
+        """
+        if headers is None:
+            headers = array_headers(data)
+        if headers is None:
+            n_columns = 1 if data.ndim == 1 else data.shape[1]
+            headers = [str(i) for i in range(n_columns)]
+
+        fragment = self.fragment_key('write_array', data, headers,
+                                     align, hcolors, colors, virtual)
+        if self.copy_fragment(fragment, virtual):
+            return
+
+        self.declare_colors(colors)
+        with self.Table(headers, align=align, hcolors=hcolors,
+                        virtual=virtual, fragment=fragment) as tab:
+            tab.write_array(data, colors)
 
         return
 
+    @staticmethod
+    def dataframe_dtype(df):
+        """ Returns the dtype pandas upcasts the rows of df to, or None
+            when the frame cannot be formatted column wise (non-unique
+            index, datetime or extension dtypes)
+
+        The dtype is taken from an empty slice, so no copy of the frame
+        is made.
+        """
+        import numpy as np
+        from pandas.api.types import is_string_dtype
+
+        if not df.index.is_unique:
+            return None
+
+        for dtype in df.dtypes:
+            if isinstance(dtype, np.dtype):
+                if dtype.kind not in 'biufcOmM':
+                    return None
+            elif not is_string_dtype(dtype):
+                return None
+
+        return df.iloc[:0].to_numpy().dtype
+
+    @staticmethod
+    def dataframe_columns(df, dtype, start=0, stop=None):
+        """ Formats rows start up to stop of a DataFrame column by column,
+            the index being the first
+
+        Each cell is converted to exactly the string that str(cell) yields
+        for the cells of df.loc[row], including the upcasting pandas
+        applies when a row is taken from a frame with mixed dtypes. Raw
+        cells are kept, so that they are not escaped.
+
+        Args:
+            df (DataFrame): data frame to format
+            dtype (dtype): the dtype returned by dataframe_dtype(df)
+            start (int): first row formatted
+            stop (int): row after the last row formatted, None for all
+
+        Returns:
+            list of list of str, one list for each column
+        """
+        df = df.iloc[start:stop]
+        columns = [list(map(str, df.index))]
+        if dtype.kind in 'mM':
+            # datetimes are yielded as Timestamp and Timedelta
+            for i in range(df.shape[1]):
+                columns.append(list(map(str, df.iloc[:, i])))
+        elif dtype != object:
+            # df.loc[row] is upcasted to the common dtype and yields
+            # python scalars, which is what tolist() yields as well
+            values = df.to_numpy()
+            for i in range(values.shape[1]):
+                columns.append(list(map(str, values[:, i].tolist())))
+        else:
+            # mixed dtypes: df.loc[row] keeps the elements of each column
+            for i in range(df.shape[1]):
+                column = df.iloc[:, i]
+                if column.dtype.kind in 'mM':
+                    columns.append(list(map(str, column)))
+                elif column.dtype == object:
+                    # keeps Raw cells
+                    columns.append(list(map(as_text, column.to_numpy())))
+                else:
+                    columns.append(list(map(str, column.to_numpy())))
+
+        return columns
+
     def p (self, text, tag='p'):
         """ Writes text to html file, between tags when tag is not ''
         """
 
+        self.split()
+        text = self.escape(text)
         if tag == '':
-            TableWriter.HTMLFile.write (text+'\n')
+            self.write (text+'\n')
         else:
-            TableWriter.HTMLFile.write ('<'+tag+'>'+text+'</'+tag+'>\n')
+            self.write ('<'+tag+'>'+text+'</'+tag+'>\n')
 
         return
 
     def write_img (self, image, text, fn, tag):
         """ Writes a link to an image file in the html file
+
+        With dedup_images, an image with the same pixels as an image
+        written before is not saved again but linked to the first file.
+        With an image policy the image is stored as store_image() describes.
         """
 
-        w, h = image.size
-        w = str(w)
-        h = str(h)
-        image.save(fn)
-        self.p('<img src="'+fn+'" width="'+w+' height="'+h+'"></img>')
-        self.p (text, tag)
-        self.p ('<p> </p>')
+        backend = get_backend('image')
+
+        digest = None
+        stored = None
+        if self.image_cache is not None:
+            digest = backend.digest(image)
+            if digest is not None:
+                stored = self.image_cache.get(digest)
+
+        if stored is None:
+            stored = self.store_image('image', image, fn)
+            if digest is not None:
+                self.image_cache.put(digest, stored)
+
+        with self.atomic():
+            self.p(Raw(self.img_tag(*stored)))
+            self.p (text, tag)
+            self.p (Raw('<p> </p>'))
 
         return
 
     def write_img_inline (self, image, text, tag):
         """ Writes an image inline as base64 to the html file
+
+        The image is encoded and written in pieces, so the memory needed
+        does not depend on the size of the image. With dedup_images an
+        image is embedded once; repeats refer to the first copy ('inline')
+        or all copies link to a file named after the content ('sidecar').
+
+        With an image policy that sets a maximum size or a format, the
+        image is scaled down and converted with PIL before it is embedded;
+        with link_full it links to the original in the sidecar directory.
+
+        Args:
+            image: the image as bytes, bytes-like object (e.g. memoryview),
+                binary file object or path of the image file
+            text (str): text written before the image
+            tag (str): tag of text
         """
 
-        img = base64.b64encode(image).decode("utf-8")
-        img_tag = '<img src="data:image/png;base64,{:s}" />'.format(img)
-        self.p (text, tag)
-        self.p(img_tag, '')
+        self.split()
+        backend = get_backend('bytes')
+        policy = self.image_policy
+        attributes = ''
+        if policy is not None and policy.lazy:
+            attributes = ' loading="lazy"'
+
+        digest = None
+        if self.image_cache is not None:
+            digest = backend.digest(image)
+
+        if digest is not None and self.dedup_images == 'sidecar':
+            src = self.image_cache.get(digest)
+            if src is None:
+                src = self.save_sidecar(image, digest)
+                self.image_cache.put(digest, src)
+
+            with self.atomic():
+                self.p (text, tag)
+                self.write ('<img src="' + src + '"' + attributes + ' />\n')
+
+            return
+
+        key = None
+        if digest is not None:
+            key = digest[:16]
+            if self.image_cache.get(digest) is not None:
+                with self.atomic():
+                    self.image_refs = True
+                    self.p (text, tag)
+                    self.write ('<img data-image="' + key + '" />\n')
+
+                return
+
+        mime = 'image/png'
+        href = None
+        if policy is not None and policy.recodes():
+            if policy.link_full and self.stream is None:
+                if digest is None:
+                    digest = backend.digest(image)
+                if digest is not None:
+                    href = self.save_sidecar(image, digest)
+
+            data, fmt, width, height = backend.recode(image, policy)
+            image = data
+            mime = MIME_TYPES.get(fmt, 'image/' + fmt)
+            attributes = ' width="' + str(width) + '" height="' + str(height) + \
+                         '"' + attributes
+
+        with self.atomic():
+            self.p (text, tag)
+            if href is not None:
+                self.write ('<a href="' + href + '">')
+            if key is None:
+                self.write ('<img src="data:' + mime + ';base64,')
+            else:
+                self.write ('<img id="image-' + key + '" src="data:' + mime + ';base64,')
+            for chunk in backend.chunks(image):
+                self.write (chunk)
+            self.write ('"' + attributes + ' />')
+            self.write ('</a>\n' if href is not None else '\n')
         #self.p ('<p> </p>')
 
+        if key is not None:
+            self.image_cache.put(digest, key)
+
         return
 
-    def write_mat (self, image, text, fn, tag, size=None):#, fmt='jpg'):
-        _, ext = os.path.splitext(fn)
-        if len(ext) < 2:
-            ext = 'png'
+    def save_image(self, name, image, fn, fmt=None, quality=None):
+        """ Saves image as fn with backend name, in a worker when there
+            is an encoder pool
+        """
+        if self.encoder is not None:
+            self.encoder.submit(name, image, fn, fmt, quality)
+        elif quality is None:
+            get_backend(name).save(image, fn, fmt)
         else:
-            ext = ext[1:]
+            get_backend(name).save(image, fn, fmt, quality)
 
-        if size is None:
-            w = str(image.shape[0])
-            h = str(image.shape[1])
-        else:
-            w = str(size[0])
-            h = str(size[1])
+        return
+
+    def store_image(self, name, image, fn):
+        """ Saves image with backend name as the image policy sets
+
+        Without a policy the image is saved as fn. An image larger than
+        the maximum size of the policy is scaled down; with a format
+        it is saved with the extension of that format instead of the
+        extension of fn. With link_full such a display image is saved
+        next to fn with _display appended to its name, and fn keeps
+        the image as given.
+
+        Returns:
+            src, width and height of the image shown and the name of the
+            full image or None
+        """
+        _, ext = os.path.splitext(fn)
+        ext = ext[1:].lower() if len(ext) > 1 else 'png'
+        backend = get_backend(name)
+        width, height = backend.size(image)
+        policy = self.image_policy
+        if policy is None or not policy.recodes():
+            self.save_image(name, image, fn, ext)
+
+            return fn, width, height, None
+
+        display_width, display_height = policy.fit(width, height)
+        fmt = ext if policy.format is None else policy.format
+        if (display_width, display_height) == (width, height) and fmt == ext:
+            self.save_image(name, image, fn, ext, policy.quality)
+
+            return fn, width, height, None
+
+        href = None
+        base = os.path.splitext(fn)[0]
+        if policy.link_full:
+            self.save_image(name, image, fn, ext)
+            href = fn
+            base += '_display'
+
+        if (display_width, display_height) != (width, height):
+            resized = backend.resize(image, display_width, display_height)
+            if resized is not image:
+                # backends may round the size, e.g. to an integer factor
+                display_width, display_height = backend.size(resized)
+                image = resized
+
+        src = base + '.' + fmt
+        self.save_image(name, image, src, fmt, policy.quality)
+
+        return src, display_width, display_height, href
+
+    def img_tag(self, src, width, height, href=None):
+        """ Returns the img element showing src, lazily loaded when the
+            image policy says so and linked to href when given
+        """
+        lazy = ''
+        if self.image_policy is not None and self.image_policy.lazy:
+            lazy = ' loading="lazy"'
+
+        tag = '<img src="' + src + '" width="' + str(width) + '" height="' + \
+              str(height) + '"' + lazy + '></img>'
+        if href is not None:
+            tag = '<a href="' + href + '">' + tag + '</a>'
+
+        return tag
 
-        plt.imsave(fn, image, format=ext)
-        self.p('<img src="'+fn+'" width="'+w+' height="'+h+'"></img>')
-        self.p(text, tag)
-        self.p('<p>\t</p>')
+    def save_sidecar(self, image, digest):
+        """ Saves image in the directory next to the html file
+
+        The directory is named after the html file with _files appended,
+        the file after the digest of the image, with the extension of its
+        format.
+
+        Returns:
+            the name of the saved file relative to the html file
+        """
+        directory = os.path.splitext(self.file_name)[0] + '_files'
+        os.makedirs(directory, exist_ok=True)
+        backend = get_backend('bytes')
+        name = digest + '.' + backend.image_format(image)
+        fn = os.path.join(directory, name)
+        if not os.path.exists(fn):
+            backend.save(image, fn)
+
+        return os.path.basename(directory) + '/' + name
+
+    def write_mat (self, image, text, fn, tag, size=None):#, fmt='jpg'):
+        """ Saves an array as image file fn and writes a link to it
+
+        Args:
+            image (ndarray): rows x columns (x channels) array
+            text (str): text written after the image
+            fn (str): name of the image file, its extension sets the format
+            tag (str): tag of text
+            size (tuple): width and height shown, None for the size of
+                the image as stored
+        """
+        src, width, height, href = self.store_image('array', image, fn)
+        if size is not None:
+            width, height = size
+
+        with self.atomic():
+            self.p(Raw(self.img_tag(src, width, height, href)))
+            self.p(text, tag)
+            self.p(Raw('<p>\t</p>'))
 
         return
 
     def flush(self):
-        TableWriter.HTMLFile.flush()
+        with self.atomic():
+            self.HTMLFile.flush()
+
+    def getvalue(self):
+        """ Returns the html written by a writer opened with file_name None
+
+        Can be called while writing and after the writer has been closed.
+        In background mode drain() first.
+        """
+        if self.buffer is None:
+            raise ValueError('Only a TableWriter writing to memory has a value')
+
+        return self.buffer.getvalue()
+
+    def tobytes(self):
+        """ Returns getvalue() encoded with the encoding of the writer
+        """
+        return self.getvalue().encode(self.encoding)
+
+    def stats(self):
+        """ Returns the statistics of an instrumented writer
+
+        Returns:
+            dict with 'methods': calls, seconds and chars (characters
+            written, before encoding or compression) per method;
+            'tables': count, rows, chars and seconds of all tables;
+            'last_tables': the same for the most recent tables; 'chars'
+            and 'flushes': totals of the file.
+            None when the writer is not instrumented.
+        """
+        if self.statistics is None:
+            return None
+
+        return self.statistics.snapshot(self.HTMLFile)
+
+    def drain(self):
+        """ Waits until everything written so far is in the file
+
+        In background mode this waits for the I/O thread, otherwise
+        it is the same as flush(). Images saved by the encoder pool
+        are waited for as well.
+        """
+        if self.encoder is not None:
+            self.encoder.wait()
+
+        with self.atomic():
+            if self.background:
+                self.HTMLFile.drain()
+            else:
+                self.HTMLFile.flush()
+
+        return
+
+    async def adrain(self):
+        """ drain() without blocking the event loop
+        """
+        import asyncio
+
+        await asyncio.get_running_loop().run_in_executor(None, self.drain)
+
+        return
+
+    async def aclose(self):
+        """ close() without blocking the event loop
+        """
+        import asyncio
+
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+        return
 
     def close (self):
         """ Writes html footer and closes html file
         """
 
-        self.write_html_footer ()
-        TableWriter.HTMLFile.close ()
+        try:
+            if self.encoder is not None:
+                self.encoder.close()
+        finally:
+            with self.atomic():
+                self.write_html_footer ()
+                if self.resume:
+                    # remove what is left of an overwritten footer
+                    self.HTMLFile.truncate()
+                if self.flush_policy.fsync is not None:
+                    self.sync()
+                self.HTMLFile.close ()
+
+        if self.sharded:
+            self.shards.append({'file': self.shard_name(len(self.shards) + 1),
+                                'tables': self.shard_tables})
+            self.write_index()
+
+        # the writers opened by the thread that opened this writer
+        if self in self.opened_with:
+            self.opened_with.remove(self)
 
         return
 
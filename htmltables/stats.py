@@ -0,0 +1,137 @@
+"""
+MIT License
+
+Copyright (c) 2019 Arnold Reinders
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import time
+import threading
+import functools
+import collections
+
+class Stats(object):
+    """ Collects call counts, wall time and characters written per method
+
+    The methods of a TableWriter and its tables are wrapped on the instance
+    when instrumentation is enabled; without it nothing is wrapped, so
+    there is no cost at all. Times and characters of a method include
+    those of the methods it calls, e.g. write_img_inline includes p.
+    When several threads share a writer the characters counted for a
+    writer method include what other threads wrote meanwhile.
+    """
+    # called too often to pass each call to the hook
+    ROW_METHODS = ('row', 'rows', 'write_columns')
+
+    def __init__(self, hook=None, max_tables=1000):
+        """ Creates empty statistics
+
+        Args:
+            hook (callable): called with a dict for each call of a writer
+                method and for each table written, e.g. to forward them to
+                a metrics system
+            max_tables (int): number of most recent tables kept in stats
+        """
+        self.hook = hook
+        self.methods = {}
+        self.tables = collections.deque(maxlen=max_tables)
+        self.table_totals = {'count': 0, 'rows': 0, 'chars': 0, 'seconds': 0.0}
+        self.lock = threading.Lock()
+
+        return
+
+    def timed(self, name, method, position):
+        """ Returns method wrapped to record its calls under name
+
+        Args:
+            name (str): name the calls are recorded under
+            method (callable): the bound method to wrap
+            position (callable): returns the number of characters written
+                so far by the stream the method writes to
+        """
+        with self.lock:
+            entry = self.methods.setdefault(name, {'calls': 0, 'seconds': 0.0, 'chars': 0})
+        hook = self.hook if name not in Stats.ROW_METHODS else None
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            written = position()
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                written = position() - written
+                with self.lock:
+                    entry['calls'] += 1
+                    entry['seconds'] += seconds
+                    entry['chars'] += written
+                if hook is not None:
+                    hook({'method': name, 'seconds': seconds, 'chars': written})
+
+        return wrapper
+
+    def instrument(self, obj, names, position):
+        """ Replaces the methods names of obj by timed versions
+        """
+        for name in names:
+            setattr(obj, name, self.timed(name, getattr(obj, name), position))
+
+        return
+
+    def begin_table(self, table):
+        """ Called when table is entered, after its stream has been set
+        """
+        table.stats_start = (time.perf_counter(), table.out.total)
+
+        return
+
+    def end_table(self, table):
+        """ Records the totals of table, called before its stream is closed
+        """
+        start, written = table.stats_start
+        record = {'columns': len(table.table_headers),
+                  'rows': table.row_count,
+                  'chars': table.out.total - written,
+                  'seconds': time.perf_counter() - start}
+        with self.lock:
+            self.tables.append(record)
+            totals = self.table_totals
+            totals['count'] += 1
+            totals['rows'] += record['rows']
+            totals['chars'] += record['chars']
+            totals['seconds'] += record['seconds']
+        if self.hook is not None:
+            self.hook(record)
+
+        return
+
+    def snapshot(self, stream):
+        """ Returns a copy of the statistics as a dict
+
+        Args:
+            stream (CountingFile): the file of the writer, for the total
+                number of characters written and of flushes
+        """
+        with self.lock:
+            return {'methods': {name: dict(entry) for name, entry in self.methods.items()},
+                    'tables': dict(self.table_totals),
+                    'last_tables': list(self.tables),
+                    'chars': stream.total if stream is not None else 0,
+                    'flushes': stream.flushes if stream is not None else 0}
@@ -0,0 +1,423 @@
+"""
+MIT License
+
+Copyright (c) 2019 Arnold Reinders
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import io
+import os
+import time
+import queue
+import threading
+
+class FlushPolicy(object):
+    """ Determines when a TableWriter flushes its file and syncs it to disk
+
+    The default policy flushes when a table is entered, which is what
+    TableWriter always did. See throughput() and durable() for the two
+    extremes.
+    """
+    def __init__(self, buffer_size=None, every_bytes=None, every_seconds=None,
+                 table=True, fsync=None):
+        """ Defines a flush policy
+
+        Args:
+            buffer_size (int): size of the buffer of the file in bytes,
+                None for the default of open(); compressed files have
+                buffers of their own and ignore it
+            every_bytes (int): flush after this many characters have been
+                written since the last flush
+            every_seconds (float): flush on the first write at least this
+                many seconds after the last flush
+            table (bool): flush when a table is entered
+            fsync (str): None never syncs to disk; 'close' syncs when the
+                writer is closed; 'table' also after each table
+        """
+        if fsync not in (None, 'close', 'table'):
+            raise ValueError("fsync should be None, 'close' or 'table', not " +
+                             repr(fsync))
+
+        self.buffer_size = buffer_size
+        self.every_bytes = every_bytes
+        self.every_seconds = every_seconds
+        self.table = table
+        self.fsync = fsync
+
+        return
+
+    @staticmethod
+    def throughput(buffer_size=1 << 20):
+        """ Never flushes before the file is closed, with a large buffer
+        """
+        return FlushPolicy(buffer_size=buffer_size, table=False)
+
+    @staticmethod
+    def durable():
+        """ Flushes and syncs to disk after each table
+        """
+        return FlushPolicy(table=True, fsync='table')
+
+    def periodic(self):
+        return self.every_bytes is not None or self.every_seconds is not None
+
+class PolicyFile(object):
+    """ File-like object that flushes a file after a number of characters
+        or seconds, as set by a FlushPolicy
+    """
+    def __init__(self, file, policy):
+        self.file = file
+        self.every_bytes = policy.every_bytes
+        self.every_seconds = policy.every_seconds
+        self.unflushed = 0
+        self.flushed_at = time.monotonic()
+
+        return
+
+    def write(self, text):
+        n = self.file.write(text)
+        self.unflushed += len(text)
+        if self.every_bytes is not None and self.unflushed >= self.every_bytes:
+            self.flush()
+        elif self.every_seconds is not None and \
+             time.monotonic() - self.flushed_at >= self.every_seconds:
+            self.flush()
+
+        return n
+
+    def flush(self):
+        self.file.flush()
+        self.unflushed = 0
+        self.flushed_at = time.monotonic()
+
+        return
+
+    def close(self):
+        self.file.close()
+
+        return
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+class CountingFile(object):
+    """ File-like object that counts the characters written to a file
+
+    written counts the characters written to this file, total and flushes
+    continue the counts of the file it replaces, if any.
+    """
+    def __init__(self, file, previous=None):
+        self.file = file
+        self.written = 0
+        self.total = previous.total if previous is not None else 0
+        self.flushes = previous.flushes if previous is not None else 0
+
+        return
+
+    def write(self, text):
+        self.written += len(text)
+        self.total += len(text)
+
+        return self.file.write(text)
+
+    def flush(self):
+        self.flushes += 1
+        self.file.flush()
+
+        return
+
+    def close(self):
+        self.file.close()
+
+        return
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+class TeeFile(object):
+    """ File-like object that writes to a file and to a copy
+    """
+    def __init__(self, file, copy):
+        self.file = file
+        self.copy = copy
+
+        return
+
+    def write(self, text):
+        self.copy.write(text)
+
+        return self.file.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+class StreamFile(object):
+    """ File-like object that writes to a stream owned by the caller
+
+    The stream can be a text file, a binary file or a socket (an object
+    with sendall but no write). Text for binary streams and sockets is
+    encoded and sent in chunks of about chunk_size characters. close()
+    flushes, the stream itself is left open.
+    """
+    def __init__(self, stream, encoding='utf-8', chunk_size=65536):
+        """ Wraps stream
+
+        Args:
+            stream: text or binary file-like object or socket
+            encoding (str): encoding of the text for binary streams and sockets
+            chunk_size (int): number of characters collected before they
+                are sent to a binary stream or socket
+        """
+        self.stream = stream
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.buffered = 0
+        if hasattr(stream, 'write'):
+            self.send = stream.write
+            self.binary = isinstance(stream, (io.RawIOBase, io.BufferedIOBase)) or \
+                          'b' in getattr(stream, 'mode', '')
+        else:
+            self.send = stream.sendall
+            self.binary = True
+
+        return
+
+    def write(self, text):
+        if not self.binary:
+            return self.stream.write(text)
+
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.chunk_size:
+            self.send_buffer()
+
+        return len(text)
+
+    def send_buffer(self):
+        if len(self.buffer) > 0:
+            self.send(''.join(self.buffer).encode(self.encoding))
+            self.buffer = []
+            self.buffered = 0
+
+        return
+
+    def flush(self):
+        self.send_buffer()
+        if hasattr(self.stream, 'flush'):
+            self.stream.flush()
+
+        return
+
+    def fileno(self):
+        return self.stream.fileno()
+
+    def close(self):
+        """ Flushes, the stream is closed by its owner
+        """
+        self.flush()
+
+        return
+
+# file name extension of each codec of open_compressed
+COMPRESSED_EXTENSIONS = {'gzip': '.gz', 'bz2': '.bz2', 'lzma': '.xz', 'zstd': '.zst'}
+
+def open_compressed(file_name, codec, level=None):
+    """ Opens file_name as a text file that is compressed while written
+
+    The compressors work on a stream, so memory use does not depend on
+    the size of the file. The codec modules are imported on first use.
+
+    Args:
+        file_name (str): name of the file
+        codec (str): 'gzip', 'bz2', 'lzma' or 'zstd'; zstd needs Python
+            3.14 or the zstandard package
+        level (int): compression level, None for the default of the codec
+
+    Raises:
+        ValueError when codec is unknown
+    """
+    mode = 'wt'
+    if codec == 'gzip':
+        import gzip
+
+        return gzip.open(file_name, mode, compresslevel=9 if level is None else level)
+
+    if codec == 'bz2':
+        import bz2
+
+        return bz2.open(file_name, mode, compresslevel=9 if level is None else level)
+
+    if codec == 'lzma':
+        import lzma
+
+        return lzma.open(file_name, mode, preset=level)
+
+    if codec == 'zstd':
+        try:
+            from compression import zstd
+
+            return zstd.open(file_name, mode, level=level)
+
+        except ImportError:
+            import zstandard
+
+            compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+
+            return zstandard.open(file_name, mode, cctx=compressor)
+
+    raise ValueError("compress should be None, 'gzip', 'bz2', 'lzma' or 'zstd', "
+                     "not " + repr(codec))
+
+class BackgroundFile(object):
+    """ File-like object that writes to a file from a dedicated thread
+
+    Text written is collected in chunks of chunk_size characters. Full
+    chunks are put on a bounded queue that is drained by the I/O thread,
+    so the caller only blocks when queue_size chunks are waiting. Chunks
+    are written in the order in which they were written.
+
+    Once the I/O thread fails, nothing more is written to the file and the
+    exception is raised again by each call to write, flush, drain or close.
+    """
+    FLUSH = object()
+    CLOSE = object()
+
+    def __init__(self, file, queue_size=64, chunk_size=65536, timeout=None):
+        """ Starts the I/O thread
+
+        Args:
+            file (file): the file to write to; it is closed by close()
+            queue_size (int): maximum number of chunks waiting to be written
+            chunk_size (int): number of characters collected before a chunk
+                is put on the queue
+            timeout (float): seconds to wait for room on a full queue
+                before queue.Full is raised; None waits indefinitely
+        """
+        self.file = file
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.buffer = []
+        self.buffered = 0
+        self.error = None
+        self.closed = False
+
+        self.thread = threading.Thread(target=self.run, daemon=True,
+                                       name='htmltables-writer')
+        self.thread.start()
+
+        return
+
+    def run(self):
+        """ Writes chunks from the queue until close() is called
+        """
+        while True:
+            item = self.queue.get()
+            try:
+                if item is BackgroundFile.CLOSE:
+                    return
+
+                if self.error is None:
+                    if item is BackgroundFile.FLUSH:
+                        self.file.flush()
+                    else:
+                        self.file.write(item)
+
+            except Exception as e:
+                self.error = e
+
+            finally:
+                self.queue.task_done()
+
+    def check(self):
+        """ Raises the exception of the I/O thread, if any
+        """
+        if self.error is not None:
+            raise self.error
+
+        return
+
+    def put(self, item):
+        self.check()
+        self.queue.put(item, timeout=self.timeout)
+
+        return
+
+    def write(self, text):
+        """ Adds text to the current chunk, queues the chunk when full
+        """
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.chunk_size:
+            self.put(''.join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+
+        return len(text)
+
+    def flush(self):
+        """ Queues the current chunk and a flush of the file
+
+        Does not wait for the flush to happen, see drain().
+        """
+        if len(self.buffer) > 0:
+            self.put(''.join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+
+        self.put(BackgroundFile.FLUSH)
+
+        return
+
+    def drain(self):
+        """ Waits until everything written so far has been flushed to file
+        """
+        self.flush()
+        self.queue.join()
+        self.check()
+
+        return
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def fsync(self):
+        """ Waits until everything has been written and syncs it to disk
+        """
+        self.drain()
+        os.fsync(self.file.fileno())
+
+        return
+
+    def close(self):
+        """ Writes everything still pending, stops the thread and closes the file
+        """
+        if self.closed:
+            return
+
+        self.closed = True
+        try:
+            self.drain()
+        finally:
+            self.queue.put(BackgroundFile.CLOSE)
+            self.thread.join()
+            self.file.close()
+
+        return
@@ -37,6 +37,7 @@ setup(name='htmltables',
       license='MIT',
       packages=['htmltables'],
       install_requires=['matplotlib'],
+      extras_require={'zstd': ['zstandard; python_version < "3.14"']},
       zip_safe=False,
       setup_requires=['pytest_runner'],
       #test_suite='nose.collector',
@@ -0,0 +1,104 @@
+""" write_array writes the same html as writing the rows of the array
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from htmltables import TableWriter
+
+COLORS = ['white', 'black', 'silver']
+N = 11
+rng = np.random.default_rng(0)
+
+def by_rows(rows, headers):
+    html = TableWriter(None, document=False)
+    with html:
+        with html.Table(headers) as tab:
+            for row in rows:
+                tab.alt(COLORS).row(list(row))
+
+    return html.getvalue()
+
+def by_array(data, headers=None):
+    html = TableWriter(None, document=False)
+    with html:
+        html.write_array(data, headers, colors=COLORS)
+
+    return html.getvalue()
+
+ARRAYS = {
+    'int': rng.integers(-50, 50, (N, 3)),
+    'float': rng.random((N, 3)),
+    'float32': rng.random((N, 2)).astype('float32'),
+    'complex': rng.random((N, 2)) + 1j,
+    'bool': rng.random((N, 2)) > 0.5,
+    'str': np.array([['a < ' + str(i), 'b'] for i in range(N)]),
+    'object': np.array([[i, (i,), 'x & y'] for i in range(N)], dtype=object),
+    'datetime': np.arange('2020-01-01', N, dtype='datetime64[D]').reshape(N, 1),
+    'vector': np.arange(N, dtype='uint8'),
+}
+
+@pytest.mark.parametrize('name', ARRAYS)
+def test_ndarray(name):
+    data = ARRAYS[name]
+    headers = ['c' + str(i) for i in range(1 if data.ndim == 1 else data.shape[1])]
+    rows = data.reshape(N, 1) if data.ndim == 1 else data
+    assert by_array(data, headers) == by_rows(rows, headers)
+
+def test_structured_array():
+    data = np.zeros(N, dtype=[('n', 'i4'), ('x', 'f4'), ('label', 'U8')])
+    data['n'] = np.arange(N)
+    data['x'] = rng.random(N)
+    data['label'] = ['<' + str(i) for i in range(N)]
+    assert by_array(data) == by_rows(data, ['n', 'x', 'label'])
+
+def test_chunks(monkeypatch):
+    import htmltables.htmltables
+
+    # chunks of an odd number of rows, so the colors continue across them
+    monkeypatch.setattr(htmltables.htmltables, 'CHUNK_ROWS', 4)
+    data = ARRAYS['float']
+    assert by_array(data, ['a', 'b', 'c']) == by_rows(data, ['a', 'b', 'c'])
+
+def test_arrow_table():
+    pa = pytest.importorskip('pyarrow')
+
+    x = rng.random(N).astype('float32')
+    table = pa.table({'n': np.arange(N), 'x': x, 'label': ['<' + str(i) for i in range(N)]})
+    structured = np.zeros(N, dtype=[('n', 'i8'), ('x', 'f4'), ('label', 'U8')])
+    structured['n'] = np.arange(N)
+    structured['x'] = x
+    structured['label'] = ['<' + str(i) for i in range(N)]
+    assert by_array(table) == by_array(structured)
+    assert by_array(table.to_batches()[0]) == by_array(structured)
+
+def test_arrow_nulls():
+    pa = pytest.importorskip('pyarrow')
+
+    # a float32 column formats the same with and without nulls
+    x = pa.array([0.1, None, 0.3], pa.float32())
+    table = pa.table({'x': x, 'n': pa.array([1, 2, None]), 's': ['a', None, 'c']})
+    rows = [['0.1', 1, 'a'], ['None', 2, 'None'], ['0.3', 'None', 'c']]
+    assert by_array(table) == by_rows(rows, ['x', 'n', 's'])
+    assert '0.10000000149011612' not in by_array(table)
+
+class Tensor(list):
+    """ A list of rows with a dtype and ndim, like a tensor of another
+        library that is no ndarray
+    """
+    dtype = 'float32'
+    ndim = 2
+
+def test_other_objects_with_a_dtype_are_iterated():
+    data = Tensor([[1.5, 2], [3, 4]])
+    html = TableWriter(None, document=False)
+    with html:
+        html.set_data(data=data, headers=['a', 'b'])
+        html.write_table(colors=COLORS)
+
+    expected = TableWriter(None, document=False)
+    with expected:
+        expected.set_data(data=[[1.5, 2], [3, 4]], headers=['a', 'b'])
+        expected.write_table(colors=COLORS)
+
+    assert html.getvalue() == expected.getvalue()
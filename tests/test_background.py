@@ -0,0 +1,71 @@
+""" A background writer writes the same file as a foreground writer
+"""
+import threading
+
+import pytest
+
+from htmltables import TableWriter
+from htmltables.streams import BackgroundFile
+
+def write_report(file_name, **options):
+    with TableWriter(str(file_name), **options) as html:
+        for t in range(3):
+            html.p('table ' + str(t))
+            with html.Table(['n', 'label']) as tab:
+                # more than the 64KiB chunks of the I/O thread
+                tab.rows([[i, 'row ' + str(i)] for i in range(2000)],
+                         ['white', 'black'])
+
+@pytest.mark.parametrize('queue_size', [1, 64])
+def test_close_writes_everything(tmp_path, queue_size):
+    write_report(tmp_path / 'foreground.html')
+    write_report(tmp_path / 'background.html', background=True, queue_size=queue_size)
+
+    assert (tmp_path / 'background.html').read_text() == \
+           (tmp_path / 'foreground.html').read_text()
+
+def test_thread_safe_background(tmp_path):
+    with TableWriter(str(tmp_path / 'report.html'), background=True,
+                     thread_safe=True) as html:
+        def write(t):
+            with html.Table(['thread ' + str(t)]) as tab:
+                for i in range(500):
+                    tab.row([str(t) + '-' + str(i)])
+
+        threads = [threading.Thread(target=write, args=(t,)) for t in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    text = (tmp_path / 'report.html').read_text()
+    assert text.endswith(TableWriter.FOOTER)
+    for t in range(4):
+        # tables are written as a whole
+        table = text.split('thread ' + str(t))[1].split('</table>')[0]
+        assert table.count('>' + str(t) + '-') == 500
+
+class FailingFile(object):
+    def __init__(self):
+        self.closed = False
+
+    def write(self, text):
+        raise OSError('disk full')
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+def test_close_raises_error_and_closes_file():
+    f = FailingFile()
+    background = BackgroundFile(f, chunk_size=1)
+    background.write('text')
+    with pytest.raises(OSError):
+        background.close()
+
+    assert f.closed
+    assert not background.thread.is_alive()
+    # closing again does nothing
+    background.close()
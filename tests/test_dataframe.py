@@ -0,0 +1,76 @@
+""" write_dataframe writes the same html as writing the frame row by row
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+import htmltables.htmltables
+from htmltables import TableWriter, Raw
+
+N = 25
+rng = np.random.default_rng(0)
+
+FRAMES = {
+    'numbers': pd.DataFrame({'i': rng.integers(0, 100, N), 'f': rng.random(N),
+                             'f32': rng.random(N).astype('float32')}),
+    'labels': pd.DataFrame({'i': rng.integers(0, 100, N),
+                            's': ['x < ' + str(i) for i in range(N)],
+                            'b': rng.random(N) > 0.5}),
+    'objects': pd.DataFrame({'f': [np.nan if i % 3 else 1.5 for i in range(N)],
+                             'i8': rng.integers(0, 5, N).astype('int8'),
+                             'o': pd.Series([(i, '&') for i in range(N)], dtype=object)}),
+    'dates': pd.DataFrame({'d': pd.date_range('2020', periods=N, freq='h'),
+                           'e': pd.to_timedelta(rng.integers(0, 99, N), unit='s')}),
+    'dates_mixed': pd.DataFrame({'f': rng.random(N),
+                                 'd': pd.date_range('2020', periods=N)}),
+    'timezone': pd.DataFrame({'d': pd.date_range('2020', periods=N, tz='UTC'),
+                              'f': rng.random(N)}),
+    'duplicate_index': pd.DataFrame({'i': rng.integers(0, 100, N)},
+                                    index=['r' + str(i % 7) for i in range(N)]),
+    'extension': pd.DataFrame({'i': pd.array(range(N), dtype='Int64'),
+                               'c': pd.Categorical(['u', 'v'] * (N // 2) + ['u'])}),
+    'empty': pd.DataFrame({'a': [], 'b': []}),
+}
+
+COLORS = [["white", "black"], ['white', 'black', 'silver']]
+
+def by_rows(df, colors, **options):
+    """ Returns the html of df written row by row with Table.row
+    """
+    html = TableWriter(None, document=False, **options)
+    with html:
+        with html.Table(df.columns.insert(0, ''), align=["left"]) as tab:
+            for row in df.index:
+                tab.alt(colors).row([str(row)] + [str(cell) for cell in df.loc[row]])
+
+    return html.getvalue()
+
+def by_columns(df, colors, **options):
+    html = TableWriter(None, document=False, **options)
+    with html:
+        html.write_dataframe(df, colors=colors)
+
+    return html.getvalue()
+
+@pytest.mark.parametrize('name', [n for n in FRAMES if n != 'duplicate_index'])
+@pytest.mark.parametrize('colors', COLORS)
+@pytest.mark.parametrize('escape', [True, False])
+def test_same_as_rows(name, colors, escape):
+    df = FRAMES[name]
+    assert by_columns(df, colors, escape=escape) == by_rows(df, colors, escape=escape)
+
+@pytest.mark.parametrize('colors', COLORS)
+def test_chunks(monkeypatch, colors):
+    # chunks of an odd number of rows, so the colors continue across them
+    monkeypatch.setattr(htmltables.htmltables, 'CHUNK_ROWS', 7)
+    for df in FRAMES.values():
+        if df.index.is_unique:
+            assert by_columns(df, colors) == by_rows(df, colors)
+
+def test_raw_cells():
+    link = Raw('<a href="x.html">x</a>')
+    df = pd.DataFrame({'link': pd.Series([link, '<b>'], dtype=object), 'n': [1, 2]})
+    html = by_columns(df, COLORS[0])
+    assert '>' + link + '</td>' in html
+    assert '&lt;b&gt;' in html
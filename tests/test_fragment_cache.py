@@ -0,0 +1,92 @@
+""" Tables copied from the fragment cache equal tables written anew
+"""
+import os
+
+import pytest
+
+from htmltables import TableWriter, FragmentCache, Raw
+
+DATA = {'lr': 0.1, 'epochs': 10, 'label': 'a < b'}
+
+def write(cache, method='write_dict', data=DATA, **options):
+    html = TableWriter(None, document=False, fragment_cache=cache, **options)
+    with html:
+        getattr(html, method)(data)
+
+    return html.getvalue()
+
+def test_miss_then_hit(tmp_path):
+    cache = FragmentCache(str(tmp_path))
+    expected = write(None)
+
+    assert write(cache) == expected
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert write(cache) == expected
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_changed_data_misses(tmp_path):
+    cache = FragmentCache(str(tmp_path))
+    write(cache)
+    changed = dict(DATA, lr=0.2)
+
+    assert write(cache, data=changed) == write(None, data=changed)
+    assert cache.hits == 0
+    assert len(os.listdir(str(tmp_path))) == 2
+
+def test_styling_and_escaping_are_part_of_the_key(tmp_path):
+    cache = FragmentCache(str(tmp_path))
+    write(cache)
+
+    assert write(cache, escape=False) == write(None, escape=False)
+    assert cache.hits == 0
+
+def test_eviction(tmp_path):
+    cache = FragmentCache(str(tmp_path), max_bytes=1)
+    write(cache)
+    write(cache, data=dict(DATA, lr=0.2))
+
+    # only the fragment written last is kept, even though it is too large
+    assert cache.evictions >= 1
+    assert len(os.listdir(str(tmp_path))) <= 1
+    assert write(cache) == write(None)
+
+def test_invalidate(tmp_path):
+    cache = FragmentCache(str(tmp_path))
+    write(cache)
+    write(cache, data=dict(DATA, lr=0.2))
+    cache.invalidate()
+
+    assert os.listdir(str(tmp_path)) == []
+    assert write(cache) == write(None)
+    assert cache.hits == 0
+
+def test_invalidate_key(tmp_path):
+    cache = FragmentCache(str(tmp_path))
+    write(cache)
+    key = os.listdir(str(tmp_path))[0][:-len('.html')]
+    cache.invalidate(key)
+
+    assert os.listdir(str(tmp_path)) == []
+
+def test_raw_headers(tmp_path):
+    def write_headers(cache, headers):
+        html = TableWriter(None, document=False, fragment_cache=cache)
+        with html:
+            html.write_dict(DATA, headers=headers)
+
+        return html.getvalue()
+
+    cache = FragmentCache(str(tmp_path))
+    for headers in (['<b>k</b>', 'v'], [Raw('<b>k</b>'), 'v'], ['<b>k</b>', 'v']):
+        assert write_headers(cache, headers) == write_headers(None, headers)
+    assert cache.hits == 1
+
+@pytest.mark.parametrize('first', [0, 1])
+def test_raw_cells_of_dataframes(tmp_path, first):
+    pd = pytest.importorskip('pandas')
+
+    cache = FragmentCache(str(tmp_path))
+    frames = [pd.DataFrame({'a': pd.Series(['<b>hi</b>'], dtype=object)}),
+              pd.DataFrame({'a': pd.Series([Raw('<b>hi</b>')], dtype=object)})]
+    for df in (frames[first], frames[1 - first]):
+        assert write(cache, 'write_dataframe', df) == write(None, 'write_dataframe', df)
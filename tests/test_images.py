@@ -0,0 +1,104 @@
+""" Images are stored and linked as the image policy sets
+"""
+import io
+import os
+import re
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from htmltables import TableWriter, ImagePolicy
+
+def img_tags(file_name):
+    with open(file_name) as f:
+        return re.findall(r'<img [^>]*>', re.sub('base64,[^"]*', 'base64,', f.read()))
+
+def attributes(tag):
+    return dict(re.findall(r'(\w+)="([^"]*)"', tag))
+
+def rgba(width, height):
+    rng = np.random.default_rng(0)
+
+    return (rng.random((height, width, 4)) * 255).astype('uint8')
+
+def test_write_mat_size(tmp_path):
+    pytest.importorskip('matplotlib')
+
+    report = str(tmp_path / 'report.html')
+    with TableWriter(report) as html:
+        html.write_mat(rgba(60, 40), 'mat', str(tmp_path / 'mat.png'), 'p')
+
+    tag = attributes(img_tags(report)[0])
+    assert (tag['width'], tag['height']) == ('60', '40')
+    assert 'loading' not in tag
+
+def test_write_mat_policy(tmp_path):
+    pytest.importorskip('matplotlib')
+
+    report = str(tmp_path / 'report.html')
+    policy = ImagePolicy(max_size=50, format='jpg', quality=80, link_full=True)
+    with TableWriter(report, images=policy) as html:
+        html.write_mat(rgba(200, 100), 'mat', str(tmp_path / 'mat.png'), 'p')
+
+    with open(report) as f:
+        text = f.read()
+    tag = attributes(img_tags(report)[0])
+    assert tag['src'] == str(tmp_path / 'mat_display.jpg')
+    assert (tag['width'], tag['height']) == ('50', '25')
+    assert tag['loading'] == 'lazy'
+    assert '<a href="' + str(tmp_path / 'mat.png') + '">' in text
+    assert os.path.exists(str(tmp_path / 'mat.png'))
+    assert os.path.exists(str(tmp_path / 'mat_display.jpg'))
+
+@pytest.mark.parametrize('quality', [None, 70])
+def test_write_img_rgba_as_jpeg(tmp_path, quality):
+    Image = pytest.importorskip('PIL.Image')
+
+    report = str(tmp_path / 'report.html')
+    policy = ImagePolicy(max_size=100, format='jpeg', quality=quality)
+    with TableWriter(report, images=policy) as html:
+        html.write_img(Image.fromarray(rgba(300, 150)), 'img', str(tmp_path / 'img.png'), 'p')
+
+    tag = attributes(img_tags(report)[0])
+    assert tag['src'] == str(tmp_path / 'img.jpeg')
+    assert (tag['width'], tag['height']) == ('100', '50')
+    assert Image.open(tag['src']).size == (100, 50)
+
+def encoded(fmt, width=300, height=200):
+    Image = pytest.importorskip('PIL.Image')
+
+    data = io.BytesIO()
+    Image.fromarray(rgba(width, height)[:, :, :3]).save(data, fmt)
+
+    return data.getvalue()
+
+def test_inline_policy(tmp_path):
+    report = str(tmp_path / 'report.html')
+    policy = ImagePolicy(max_size=150, format='webp', quality=60)
+    with TableWriter(report, images=policy) as html:
+        html.write_img_inline(encoded('png'), 'inline', 'p')
+
+    tag = attributes(img_tags(report)[0])
+    assert tag['src'] == 'data:image/webp;base64,'
+    assert (tag['width'], tag['height']) == ('150', '100')
+
+@pytest.mark.parametrize('fmt, extension', [('jpeg', 'jpg'), ('webp', 'webp'), ('png', 'png')])
+def test_inline_link_full_keeps_format(tmp_path, fmt, extension):
+    report = str(tmp_path / 'report.html')
+    with TableWriter(report, images=ImagePolicy(max_size=100, link_full=True)) as html:
+        html.write_img_inline(encoded(fmt), 'inline', 'p')
+
+    with open(report) as f:
+        href = re.search(r'<a href="([^"]+)">', f.read()).group(1)
+    assert href.startswith('report_files/') and href.endswith('.' + extension)
+    assert os.path.exists(str(tmp_path / href))
+
+def test_no_policy_keeps_inline_images(tmp_path):
+    report = str(tmp_path / 'report.html')
+    data = encoded('png')
+    with TableWriter(report) as html:
+        html.write_img_inline(data, 'inline', 'p')
+
+    with open(report) as f:
+        assert 'width=' not in f.read()
@@ -0,0 +1,37 @@
+""" Importing htmltables has no side effects and stays fast
+"""
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# seconds, generous to leave room for slow machines
+MAX_IMPORT_TIME = 1.0
+
+def python(code):
+    """ Runs code in a new interpreter, returns its stdout and stderr
+    """
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+
+    return result.stdout, result.stderr
+
+def test_import_prints_nothing():
+    assert python('import htmltables') == ('', '')
+
+def test_import_does_not_import_matplotlib():
+    stdout, _ = python('import sys, json, htmltables\n'
+                       'print(json.dumps(sorted(sys.modules)))')
+    modules = json.loads(stdout)
+    assert 'htmltables' in modules
+    assert not [m for m in modules if m.split('.')[0] == 'matplotlib']
+
+def test_import_time():
+    code = ('import time\n'
+            't = time.perf_counter()\n'
+            'import htmltables\n'
+            'print(time.perf_counter() - t)')
+    seconds = min(float(python(code)[0]) for i in range(3))
+    assert seconds < MAX_IMPORT_TIME
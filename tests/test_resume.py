@@ -0,0 +1,72 @@
+""" A resumed report equals the report written in one go
+"""
+from htmltables import TableWriter
+
+def write_table(html, name, rows):
+    html.p(name, 'h2')
+    with html.Table(['n', name]) as tab:
+        tab.rows([[i, name + ' ' + str(i)] for i in range(rows)], ['white', 'black'])
+
+def test_resume_appends_in_front_of_footer(tmp_path):
+    with TableWriter(str(tmp_path / 'once.html')) as html:
+        write_table(html, 'first', 5)
+        write_table(html, 'second', 7)
+
+    with TableWriter(str(tmp_path / 'resumed.html'), resume=True) as html:
+        write_table(html, 'first', 5)
+    with TableWriter(str(tmp_path / 'resumed.html'), resume=True) as html:
+        write_table(html, 'second', 7)
+
+    assert (tmp_path / 'resumed.html').read_text() == (tmp_path / 'once.html').read_text()
+
+def test_resume_creates_a_new_file(tmp_path):
+    with TableWriter(str(tmp_path / 'once.html')) as html:
+        write_table(html, 'first', 3)
+    with TableWriter(str(tmp_path / 'new.html'), resume=True) as html:
+        write_table(html, 'first', 3)
+
+    assert (tmp_path / 'new.html').read_text() == (tmp_path / 'once.html').read_text()
+
+def test_file_is_complete_after_each_table(tmp_path):
+    with TableWriter(str(tmp_path / 'report.html'), resume=True) as html:
+        write_table(html, 'first', 3)
+        text = (tmp_path / 'report.html').read_text()
+        assert text.endswith(TableWriter.FOOTER)
+        assert text.count(TableWriter.FOOTER) == 1
+        assert 'first 2' in text
+
+def test_resume_after_crash(tmp_path):
+    # a file of a writer that crashed has no footer
+    with TableWriter(str(tmp_path / 'report.html')) as html:
+        write_table(html, 'first', 3)
+    text = (tmp_path / 'report.html').read_text()
+    (tmp_path / 'report.html').write_text(text[:-len(TableWriter.FOOTER)])
+
+    with TableWriter(str(tmp_path / 'report.html'), resume=True) as html:
+        write_table(html, 'second', 3)
+
+    text = (tmp_path / 'report.html').read_text()
+    assert text.count(TableWriter.FOOTER) == 1
+    assert text.endswith(TableWriter.FOOTER)
+    assert text.index('first 2') < text.index('second 0')
+
+def test_resume_windows_line_endings(tmp_path):
+    # a report written with \r\n line endings, as text mode does on Windows
+    with TableWriter(str(tmp_path / 'report.html')) as html:
+        write_table(html, 'first', 3)
+    data = (tmp_path / 'report.html').read_bytes()
+    (tmp_path / 'report.html').write_bytes(data.replace(b'\n', b'\r\n'))
+
+    with TableWriter(str(tmp_path / 'report.html'), resume=True) as html:
+        write_table(html, 'second', 3)
+
+    text = (tmp_path / 'report.html').read_bytes().decode()
+    assert text.count('</html>') == 1
+    assert text.endswith(TableWriter.FOOTER)
+    assert text.index('first 2') < text.index('second 0')
+
+def test_reports_have_unix_line_endings(tmp_path):
+    with TableWriter(str(tmp_path / 'report.html')) as html:
+        write_table(html, 'first', 3)
+
+    assert b'\r' not in (tmp_path / 'report.html').read_bytes()
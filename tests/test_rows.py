@@ -0,0 +1,110 @@
+""" Table.rows and Table.write_columns write the same html as Table.row
+"""
+import pytest
+
+from htmltables import TableWriter, Raw
+
+HEADERS = ['n', 'label', 'value']
+DATA = [[i, ['a', 'b < c', 'x & y', Raw('<i>r</i>')][i % 4], i / 7] for i in range(11)]
+COLORS = [None, ["white", "black"], ['white', 'black', 'silver'],
+          ['white', 'black', 'gray', 'silver']]
+
+def value(html):
+    """ Returns the html written by html, without the suffix of the class
+        names that differs per fragment
+    """
+    if html.stylesheet is None or html.stylesheet.suffix == '':
+        return html.getvalue()
+
+    return html.getvalue().replace(html.stylesheet.suffix, '')
+
+def render(write, **options):
+    """ Returns the html of a table written by write(tab)
+    """
+    html = TableWriter(None, document=False, **options)
+    with html:
+        with html.Table(HEADERS, align=['left', 'right']) as tab:
+            write(tab)
+
+    return value(html)
+
+def by_row(colors, data=DATA):
+    def write(tab):
+        for row in data:
+            if colors is None:
+                tab.row(row)
+            else:
+                tab.alt(colors).row(row)
+
+    return write
+
+OPTIONS = [{}, {'css': True}, {'escape': False}]
+
+@pytest.mark.parametrize('options', OPTIONS)
+@pytest.mark.parametrize('colors', COLORS)
+@pytest.mark.parametrize('batch_size', [1, 4, 1024])
+def test_rows(options, colors, batch_size):
+    expected = render(by_row(colors), **options)
+    assert render(lambda tab: tab.rows(DATA, colors, batch_size), **options) == expected
+    assert render(lambda tab: tab.rows(iter(DATA), colors, batch_size), **options) == expected
+
+@pytest.mark.parametrize('options', OPTIONS)
+@pytest.mark.parametrize('colors', COLORS)
+@pytest.mark.parametrize('chunk_rows', [1, 2, 3, 4096])
+def test_write_columns(options, colors, chunk_rows):
+    columns = [[str(c) if type(c) is not Raw else c for c in column]
+               for column in zip(*DATA)]
+    rows = [list(row) for row in zip(*columns)]
+    expected = render(by_row(colors, rows), **options)
+    assert render(lambda tab: tab.write_columns(columns, colors, chunk_rows),
+                  **options) == expected
+
+@pytest.mark.parametrize('colors', COLORS[1:])
+def test_colors_continue(colors):
+    # rows written after single rows continue their colors
+    def write(tab):
+        for row in DATA[:3]:
+            tab.alt(colors).row(row)
+        tab.rows(DATA[3:], colors)
+
+    assert render(write) == render(by_row(colors))
+
+@pytest.mark.parametrize('colors', COLORS[1:])
+def test_write_table(colors):
+    html = TableWriter(None, document=False)
+    with html:
+        html.set_data(data=DATA, headers=HEADERS)
+        html.write_table(align=['left', 'right'], colors=colors, batch_size=4)
+
+    assert html.getvalue() == render(by_row(colors))
+
+def test_write_dict():
+    data = {'a': 1, 'b < c': Raw('<b>2</b>'), 'c': 3.5}
+    html = TableWriter(None, document=False)
+    with html:
+        html.write_dict((pair for pair in data.items()), headers=['k', 'v'])
+        html.write_dict(data, headers=['k', 'v'])
+
+    expected = TableWriter(None, document=False)
+    with expected:
+        for i in range(2):
+            with expected.Table(['k', 'v'], align=['left']) as tab:
+                for key, value in data.items():
+                    tab.alt(["white", "black"]).row([key, value])
+
+    assert html.getvalue() == expected.getvalue()
+
+@pytest.mark.parametrize('css', [False, True])
+def test_headers_of_equal_values(css):
+    # 1, 1.0 and True are equal, as are Raw('<b>x</b>') and '<b>x</b>'
+    html = TableWriter(None, document=False, css=css)
+    with html:
+        for headers in ([1, 0], [True, False], [1.0, 0.0],
+                        ['<b>x</b>'], [Raw('<b>x</b>')]):
+            with html.Table(headers) as tab:
+                pass
+
+    text = value(html)
+    for header in ('>1<', '>0<', '>True<', '>False<', '>1.0<', '>0.0<',
+                   '>&lt;b&gt;x&lt;/b&gt;<', '><b>x</b><'):
+        assert header in text
@@ -0,0 +1,63 @@
+""" A sharded report holds the same rows as a single file
+"""
+import re
+
+import pytest
+
+from htmltables import TableWriter
+
+ROW = re.compile(r'   <tr>\n(.*?)   </tr>\n', re.S)
+
+def write_report(file_name, **options):
+    with TableWriter(str(file_name), **options) as html:
+        html.p('first table')
+        with html.Table(['n', 'square']) as tab:
+            for i in range(25):
+                tab.alt(['white', 'black', 'silver']).row([i, i * i])
+        html.p('second table')
+        with html.Table(['label']) as tab:
+            tab.rows([['row ' + str(i)] for i in range(13)], ['white', 'black'])
+
+def data_rows(html):
+    return [row for row in ROW.findall(html) if '<th' not in row]
+
+@pytest.mark.parametrize('options', [{'shard_rows': 10}, {'shard_bytes': 2000},
+                                     {'shard_rows': 7, 'css': True}])
+def test_shards_hold_all_rows(tmp_path, options):
+    write_report(tmp_path / 'single.html', css=options.get('css', False))
+    write_report(tmp_path / 'report.html', **options)
+
+    single = (tmp_path / 'single.html').read_text()
+    shards = sorted(tmp_path.glob('report-*.html'))
+    assert len(shards) > 1
+
+    rows = []
+    for shard in shards:
+        html = shard.read_text()
+        assert html.startswith(TableWriter.HTML_OPEN)
+        assert html.endswith(TableWriter.FOOTER)
+        # a table continued in a shard starts with its header again
+        for table in html.split('<table')[1:]:
+            assert '<th' in table.split('</tr>')[0]
+        rows += data_rows(html)
+        if 'shard_rows' in options:
+            assert len(data_rows(html)) <= options['shard_rows']
+
+    if options.get('css'):
+        # each shard declares its classes again, with the same names
+        pattern = re.compile(r'<style>.*?</style>\n', re.S)
+        rows = [pattern.sub('', row) for row in rows]
+    assert rows == data_rows(single)
+
+def test_index_links_shards(tmp_path):
+    write_report(tmp_path / 'report.html', shard_rows=10)
+
+    index = (tmp_path / 'report.html').read_text()
+    shards = sorted(path.name for path in tmp_path.glob('report-*.html'))
+    assert re.findall(r'<a href="([^"]+)">', index) == shards
+    assert 'Table 1: rows 1-10' in index
+    assert 'Table 2: rows 1-' in index
+
+def test_sharded_writer_is_not_thread_safe(tmp_path):
+    with pytest.raises(ValueError):
+        TableWriter(str(tmp_path / 'report.html'), shard_rows=10, thread_safe=True)
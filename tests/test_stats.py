@@ -0,0 +1,22 @@
+""" The stats of an instrumented TableWriter count the characters written
+"""
+from htmltables import TableWriter
+
+def test_chars_counted(tmp_path):
+    records = []
+    name = str(tmp_path / 'report.html')
+    with TableWriter(name, instrument=True, stats_hook=records.append) as html:
+        with html.Table(['name', 'value']) as tab:
+            tab.row(['été', 1])
+            tab.row(['hiver', 2])
+        stats = html.stats()
+
+    with open(name, encoding='utf-8', newline='') as fh:
+        text = fh.read()
+    assert 'bytes' not in stats
+    assert 0 < stats['chars'] <= len(text)
+    assert stats['tables']['rows'] == 2
+    assert stats['tables']['chars'] == stats['last_tables'][-1]['chars'] > 0
+    assert all('chars' in record for record in records)
+
+    return